@@ -12,3 +12,11 @@ ALGORITHM = os.getenv("ALGORITHM")
 SUPER_ADMIN_USERNAME = os.getenv("SUPER_ADMIN_USERNAME")
 SUPER_ADMIN_EMAIL = os.getenv("SUPER_ADMIN_EMAIL")
 SUPER_ADMIN_PASSWORD = os.getenv("SUPER_ADMIN_PASSWORD")
+
+# Barcode allocation: "plain" (numeric sequence) or "ean13"
+# (in-store EAN-13 with check digit)
+BARCODE_FORMAT = os.getenv("BARCODE_FORMAT", "plain")
+BARCODE_BLOCK_SIZE = int(os.getenv("BARCODE_BLOCK_SIZE", "50"))
+
+# Cached Gemini suggestion responses expire after this many seconds
+AI_CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", "21600"))
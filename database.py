@@ -1,6 +1,7 @@
 from pymongo import MongoClient
+from pymongo.errors import OperationFailure
 from pymongo.server_api import ServerApi
-from config import MONGO_URL, DB_NAME
+from config import MONGO_URL, DB_NAME, AI_CACHE_TTL_SECONDS
 import certifi
 
 # MongoDB Client (Atlas/Local)
@@ -15,3 +16,60 @@ db = client[DB_NAME]
 users_collection = db["users"]
 products_collection = db["products"]
 categories_collection = db["categories"]
+sales_collection = db["sales"]
+
+
+# Runs callback(session) inside a multi-document transaction.
+# Transient errors are retried by the driver; any other exception
+# (including HTTPException) aborts the transaction and is re-raised.
+def run_in_transaction(callback):
+    with client.start_session() as session:
+        return session.with_transaction(callback)
+
+
+# Indexes backing the hot query paths. Called once at startup;
+# create_index is a no-op when the index already exists.
+def ensure_indexes():
+    # barcode scans and checkout lookups
+    products_collection.create_index([("barcode", 1), ("is_active", 1)])
+    try:
+        products_collection.create_index("barcode", unique=True)
+    except OperationFailure as e:
+        print(f"⚠️ Could not create unique barcode index (duplicate barcodes?): {e}")
+
+    # purchase invoice idempotency: one active purchase per invoice_no
+    try:
+        db["purchases"].create_index(
+            "invoice_no",
+            unique=True,
+            partialFilterExpression={"is_active": True}
+        )
+    except OperationFailure as e:
+        print(f"⚠️ Could not create unique invoice_no index (duplicate active invoices?): {e}")
+
+    # /sales/list keyset pagination and filters
+    sales_collection.create_index([("created_at", -1), ("_id", -1)])
+    sales_collection.create_index(
+        [("created_by", 1), ("created_at", -1), ("_id", -1)]
+    )
+    sales_collection.create_index(
+        [("payment_mode", 1), ("created_at", -1), ("_id", -1)]
+    )
+
+    # daily sales rollup, one document per (day, product_id)
+    db["sales_daily"].create_index(
+        [("day", 1), ("product_id", 1)],
+        unique=True
+    )
+
+    # one queued/running AI suggestion job per day (utils/ai_jobs.py)
+    db["ai_suggestion_jobs"].create_index("active_key", unique=True, sparse=True)
+
+    # Gemini response cache (utils/ai_response_cache.py), expired by Mongo
+    try:
+        db["ai_response_cache"].create_index(
+            "created_at",
+            expireAfterSeconds=AI_CACHE_TTL_SECONDS
+        )
+    except OperationFailure as e:
+        print(f"⚠️ Could not create AI response cache TTL index (TTL changed?): {e}")
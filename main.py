@@ -1,5 +1,5 @@
 from fastapi import FastAPI
-from database import users_collection
+from database import users_collection, ensure_indexes
 from models.user_model import user_model
 from utils.security import hash_password
 from config import (
@@ -9,6 +9,9 @@ from config import (
 )
 from fastapi.middleware.cors import CORSMiddleware
 from api import api_router  
+from utils import product_cache
+from utils import ai_jobs
+from utils.sales_rollup import start_initial_backfill
 
 app = FastAPI(title="Retail Stock Management Backend")
 
@@ -27,6 +30,7 @@ app.add_middleware(
 # ✅ Moved to startup event to prevent import crash
 @app.on_event("startup")
 async def startup_event():
+    ai_jobs.start_worker()
     try:
         print("🔄 Checking database connection...")
         # Simple check to trigger connection
@@ -34,6 +38,9 @@ async def startup_event():
         print("✅ Database Connected")
         
         create_default_super_admin()
+        ensure_indexes()
+        start_initial_backfill()
+        product_cache.start_change_stream_watcher()
     except Exception as e:
         print(f"⚠️ Database Connection Warning: {e}")
         print("⚠️ Ensure your IP is whitelisted in MongoDB Atlas.")
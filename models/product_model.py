@@ -13,6 +13,8 @@ def product_model(
         "name": name,
         "category_id": category_id,
         "purchase_price": purchase_price,
+        "avg_cost": purchase_price,  # moving average, kept by purchases
+        "inventory_value": stock_qty * purchase_price,
         "selling_price": selling_price,
         "barcode": barcode,          # ✅ AUTO GENERATED
         "stock_qty": stock_qty,
@@ -1,14 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from bson import ObjectId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
 from datetime import datetime
-from utils.barcode_utils import generate_unique_barcode
+from typing import Optional
+from utils.barcode_utils import allocate_barcode, allocate_barcodes
 from database import db
 from models.product_model import product_model
-from schemas.product_schema import ProductCreateSchema, ProductUpdateSchema
+from schemas.product_schema import (
+    ProductCreateSchema,
+    ProductUpdateSchema,
+    BarcodeLookupSchema
+)
 from utils.security import get_current_user, admin_or_super_admin
+from utils import product_cache
+from utils.category_cache import category_name, get_categories
+from utils.import_utils import iter_upload_rows
+from utils.streaming import stream_cursor
 products_collection = db["products"]
 categories_collection = db["categories"]
 
+MAX_BARCODES_PER_LOOKUP = 1000
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+# spreadsheet header -> ProductCreateSchema field
+IMPORT_COLUMN_ALIASES = {
+    "product_name": "name",
+    "category_name": "category",
+    "category_id": "category",
+    "cost_price": "purchase_price",
+    "price": "selling_price",
+    "stock": "stock_qty",
+    "qty": "stock_qty"
+}
+
 router = APIRouter(
     prefix="/products",
     tags=["Products"]
@@ -31,7 +57,7 @@ def add_product(
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
 
-    barcode = generate_unique_barcode(products_collection)
+    barcode = allocate_barcode()
 
     products_collection.insert_one(
         product_model(
@@ -44,35 +70,128 @@ def add_product(
         )
     )
 
-
     return {
         "message": "Product added successfully",
         "barcode": barcode
     }
 # -------------------------------------------------
+# BULK IMPORT FROM EXCEL / CSV
+# Access: Super Admin, Admin
+# Columns: name, category (name or id), purchase_price,
+#          selling_price, stock_qty
+# -------------------------------------------------
+@router.post("/import")
+def import_products(
+    file: UploadFile = File(...),
+    user=Depends(admin_or_super_admin)
+):
+    # active categories by id and by (case-insensitive) name
+    category_ids = {}
+    for category_id, category in get_categories().items():
+        if category["is_active"]:
+            category_ids[category_id] = category_id
+            category_ids[category["name"].strip().lower()] = category_id
+
+    inserted = 0
+    errors = []
+    failed = 0
+
+    def report(row_number, error):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"row": row_number, "error": error})
+
+    def flush(batch):
+        nonlocal inserted
+        if not batch:
+            return
+
+        barcodes = allocate_barcodes(len(batch))
+        docs = [
+            product_model(
+                name=product.name,
+                category_id=product.category_id,
+                purchase_price=product.purchase_price,
+                selling_price=product.selling_price,
+                barcode=barcode,
+                stock_qty=product.stock_qty
+            )
+            for (_, product), barcode in zip(batch, barcodes)
+        ]
+
+        try:
+            result = products_collection.insert_many(docs, ordered=False)
+            inserted += len(result.inserted_ids)
+        except BulkWriteError as e:
+            inserted += e.details.get("nInserted", 0)
+            for write_error in e.details.get("writeErrors", []):
+                report(batch[write_error["index"]][0], write_error.get("errmsg"))
+
+    batch = []
+
+    for row_number, row in iter_upload_rows(file, IMPORT_COLUMN_ALIASES):
+        category = str(row.pop("category", "") or "").strip()
+        category_id = category_ids.get(category.lower())
+
+        if not category_id:
+            report(row_number, f"Category not found: {category or '(blank)'}")
+            continue
+
+        if row.get("stock_qty") is None:
+            row.pop("stock_qty", None)
+        if row.get("name") is not None:
+            row["name"] = str(row["name"])
+
+        try:
+            product = ProductCreateSchema(category_id=category_id, **row)
+        except ValidationError as e:
+            report(row_number, "; ".join(
+                f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}"
+                for err in e.errors()
+            ))
+            continue
+
+        batch.append((row_number, product))
+
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush(batch)
+            batch = []
+
+    flush(batch)
+
+    return {
+        "message": f"Imported {inserted} products",
+        "inserted": inserted,
+        "failed": failed,
+        "errors": errors
+    }
+
+# -------------------------------------------------
 # LIST PRODUCTS
 # Access: Super Admin, Admin, Staff
 # -------------------------------------------------
 @router.get("/list")
-def list_products(user=Depends(get_current_user)):
-    result = []
-
-    for product in products_collection.find({"is_active": True}):
-        category = categories_collection.find_one(
-            {"_id": ObjectId(product["category_id"])},
-            {"name": 1}
-        )
-
-        result.append({
+def list_products(
+    stream: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    def product_row(product):
+        return {
             "id": str(product["_id"]),
             "name": product["name"],
-            "category": category["name"] if category else None,
+            "category": category_name(product["category_id"]),
             "purchase_price": product["purchase_price"],
             "selling_price": product["selling_price"],
             "stock_qty": product["stock_qty"]
-        })
+        }
 
-    return result
+    products = products_collection.find({"is_active": True})
+
+    if stream:
+        return stream_cursor(products, product_row, stream)
+
+    return [product_row(product) for product in products]
 
 @router.put("/update/{product_id}")
 def update_product(
@@ -94,11 +213,20 @@ def update_product(
     
     update_data["updated_at"] = datetime.utcnow()
 
+    # a manual stock correction is valued at the current average cost
     products_collection.update_one(
         {"_id": ObjectId(product_id)},
-        {"$set": update_data}
+        [
+            {"$set": {k: {"$literal": v} for k, v in update_data.items()}},
+            {"$set": {"inventory_value": {"$multiply": [
+                {"$max": [{"$ifNull": ["$stock_qty", 0]}, 0]},
+                {"$ifNull": ["$avg_cost", "$purchase_price"]}
+            ]}}}
+        ]
     )
 
+    product_cache.invalidate(barcode=product["barcode"])
+
     return {"message": "Product updated successfully"}
 
 
@@ -124,6 +252,8 @@ def delete_product(
     if delete.matched_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
 
+    product_cache.invalidate(product_id=product_id)
+
     return {"message": "Product deleted successfully"}
 
 # -------------------------------------------------
@@ -147,16 +277,53 @@ def list_products_barcode_qty(user=Depends(get_current_user)):
 
 @router.get("/by-barcode/{barcode}")
 def get_product_by_barcode(barcode: str, user=Depends(get_current_user)):
-    product = products_collection.find_one({
-        "barcode": barcode,
-        "is_active": True
-    })
+    product = product_cache.get(barcode)
 
     if not product:
         raise HTTPException(404, "Product not found")
 
     return {
-        "id": str(product["_id"]),
+        "id": product["id"],
         "name": product["name"],
         "selling_price": product["selling_price"]
     }
+
+# -------------------------------------------------
+# BULK PRICE LOOKUP (MANY BARCODES, ONE ROUND TRIP)
+# Access: Super Admin, Admin, Staff
+# Returns: barcode -> product, or null when not found
+# -------------------------------------------------
+@router.post("/by-barcodes")
+def get_products_by_barcodes(
+    data: BarcodeLookupSchema,
+    user=Depends(get_current_user)
+):
+    if len(data.barcodes) > MAX_BARCODES_PER_LOOKUP:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BARCODES_PER_LOOKUP} barcodes per request"
+        )
+
+    found = product_cache.get_many(data.barcodes)
+
+    products = {}
+    not_found = []
+
+    for barcode in dict.fromkeys(data.barcodes):
+        product = found.get(barcode)
+
+        if not product:
+            products[barcode] = None
+            not_found.append(barcode)
+            continue
+
+        products[barcode] = {
+            "id": product["id"],
+            "name": product["name"],
+            "selling_price": product["selling_price"]
+        }
+
+    return {
+        "products": products,
+        "not_found": not_found
+    }
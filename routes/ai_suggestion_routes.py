@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from bson import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime, timedelta
 from database import db
 from schemas.ai_suggestion_schema import AISuggestionUpdateSchema
-from models.ai_suggestion_model import ai_suggestion_model
 from utils.security import admin_or_super_admin
-from utils.ai_service import AIBusinessAnalyzer
+from utils.ai_jobs import submit_job, get_job, job_view
+from utils import ai_response_cache
+from utils.gemini_ai import client_stats
 
 ai_suggestions_collection = db["ai_suggestions"]
 
@@ -14,45 +16,41 @@ router = APIRouter(
     tags=["AI Suggestions"]
 )
 
-@router.post("/generate")
-def generate_daily_suggestions(user=Depends(admin_or_super_admin)):
+@router.post("/generate", status_code=202)
+def generate_daily_suggestions(
+    force: bool = False,
+    user=Depends(admin_or_super_admin)
+):
     """
-    Generate AI-powered business suggestions based on current data.
-    This can be called daily to get fresh insights.
+    Start generating AI-powered business suggestions in the background.
+    Returns a job id to poll at /ai-suggestions/jobs/{job_id}. While a job
+    is running, or once one has finished today, that job is returned
+    instead of starting another (pass force=true to regenerate).
     """
     try:
-        # Check if suggestions were already generated today
-        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        existing_today = ai_suggestions_collection.count_documents({
-            "created_at": {"$gte": today_start},
-            "is_active": True
-        })
-        
-        # Generate new suggestions
-        suggestions = AIBusinessAnalyzer.generate_suggestions()
-        
-        # Save to database
-        saved_count = 0
-        for suggestion in suggestions:
-            ai_suggestions_collection.insert_one(
-                ai_suggestion_model(
-                    suggestion_type=suggestion["type"],
-                    title=suggestion["title"],
-                    description=suggestion["description"],
-                    priority=suggestion["priority"],
-                    data_insights=suggestion["data_insights"]
-                )
-            )
-            saved_count += 1
-        
-        return {
-            "message": f"Generated {saved_count} new suggestions",
-            "suggestions": suggestions,
-            "existing_today": existing_today
-        }
+        job, created = submit_job(user["user_id"], force=force)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to generate suggestions: {str(e)}")
 
+    return {
+        "message": "Suggestion generation started" if created else "Using existing job",
+        **job_view(job)
+    }
+
+@router.get("/jobs/{job_id}")
+def get_generation_job(job_id: str, user=Depends(admin_or_super_admin)):
+    """Status of a suggestion generation job; result is set once done"""
+    try:
+        job_oid = ObjectId(job_id)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid job id")
+
+    job = get_job(job_oid)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job_view(job)
+
 @router.get("/today")
 def get_today_suggestions(user=Depends(admin_or_super_admin)):
     """Get today's AI suggestions"""
@@ -163,3 +161,11 @@ def get_suggestion_stats(user=Depends(admin_or_super_admin)):
         }
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch stats: {str(e)}")
+
+@router.get("/ai-stats")
+def get_ai_stats(user=Depends(admin_or_super_admin)):
+    """Gemini response cache counters and client health (this process)"""
+    return {
+        "cache": ai_response_cache.stats(),
+        "client": client_stats()
+    }
@@ -1,11 +1,10 @@
-from fastapi import APIRouter, Depends
-from datetime import datetime, timedelta
-from collections import defaultdict
+from fastapi import APIRouter, Depends, HTTPException
 from database import db
 from utils.security import get_current_user
-from bson import ObjectId
+from utils.single_flight import coalesce
+from utils import sales_velocity
+from utils.forecasting import forecast_demand
 
-sales_collection = db["sales"]
 products_collection = db["products"]
 
 router = APIRouter(
@@ -13,24 +12,29 @@ router = APIRouter(
     tags=["Analytics"]
 )
 
+
+def check_window(name, value):
+    if not 1 <= value <= sales_velocity.MAX_WINDOW_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{name} must be between 1 and {sales_velocity.MAX_WINDOW_DAYS}"
+        )
+
 # -------------------------------------------------
 # 1️⃣ SLOW MOVING PRODUCTS
 # -------------------------------------------------
 @router.get("/slow-moving")
+@coalesce()
 def slow_moving_products(
     days: int = 30,
     user=Depends(get_current_user)
 ):
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
-    sold_products = set()
+    check_window("days", days)
 
     # products sold in last N days
-    for sale in sales_collection.find(
-        {"created_at": {"$gte": cutoff_date}},
-        {"items.product_id": 1}
-    ):
-        for item in sale["items"]:
-            sold_products.add(item["product_id"])
+    sold_products = {
+        pid for pid, qty in sales_velocity.sold_qty(days).items() if qty > 0
+    }
 
     result = []
     for product in products_collection.find({"is_active": True}):
@@ -46,43 +50,51 @@ def slow_moving_products(
 
 # -------------------------------------------------
 # 2️⃣ RESTOCK SUGGESTIONS (AI LOGIC)
+# Days of cover at the forecast rate (Holt + weekday seasonality)
 # -------------------------------------------------
 @router.get("/restock-suggestions")
+@coalesce()
 def restock_suggestions(
     days: int = 30,
     min_days_left: int = 7,
     user=Depends(get_current_user)
 ):
-    cutoff = datetime.utcnow() - timedelta(days=days)
-    sales_map = defaultdict(int)
-
-    # total sold per product
-    for sale in sales_collection.find({"created_at": {"$gte": cutoff}}):
-        for item in sale["items"]:
-            sales_map[item["product_id"]] += item["qty"]
+    check_window("days", days)
+    check_window("min_days_left", max(min_days_left, 1))
+
+    products = list(products_collection.find(
+        {"is_active": True},
+        {"name": 1, "stock_qty": 1}
+    ))
+    horizon = max(min_days_left, 1)
+    forecasts = forecast_demand(
+        days,
+        horizon,
+        stock={str(p["_id"]): p["stock_qty"] for p in products}
+    )
 
     result = []
 
-    for product in products_collection.find({"is_active": True}):
+    for product in products:
         pid = str(product["_id"])
-        sold_qty = sales_map.get(pid, 0)
+        forecast = forecasts.get(pid)
 
-        if sold_qty == 0:
+        if not forecast or forecast["days_of_cover"] is None:
             continue
 
-        avg_daily_sales = sold_qty / days
-        days_left = product["stock_qty"] / avg_daily_sales
-
-        if days_left <= min_days_left:
+        if forecast["days_of_cover"] <= min_days_left:
             result.append({
                 "product_id": pid,
                 "name": product["name"],
                 "stock_qty": product["stock_qty"],
-                "avg_daily_sales": round(avg_daily_sales, 2),
-                "days_of_stock_left": round(days_left, 1),
+                "avg_daily_sales": round(forecast["avg_daily"], 2),
+                "forecast_daily_sales": round(forecast["forecast"] / horizon, 2),
+                "forecast_range": [round(forecast["lower"]), round(forecast["upper"])],
+                "days_of_stock_left": round(forecast["days_of_cover"], 1),
                 "suggestion": "RESTOCK"
             })
 
+    result.sort(key=lambda x: x["days_of_stock_left"])
     return result
 
 
@@ -90,32 +102,53 @@ def restock_suggestions(
 # 3️⃣ DEMAND PREDICTION
 # -------------------------------------------------
 @router.get("/demand-prediction")
+@coalesce()
 def demand_prediction(
     past_days: int = 30,
     predict_days: int = 7,
     user=Depends(get_current_user)
 ):
-    cutoff = datetime.utcnow() - timedelta(days=past_days)
-    sales_map = defaultdict(int)
-
-    for sale in sales_collection.find({"created_at": {"$gte": cutoff}}):
-        for item in sale["items"]:
-            sales_map[item["product_id"]] += item["qty"]
+    check_window("past_days", past_days)
+    check_window("predict_days", predict_days)
+
+    products = list(products_collection.find(
+        {"is_active": True},
+        {"name": 1, "stock_qty": 1}
+    ))
+    forecasts = forecast_demand(
+        past_days,
+        predict_days,
+        stock={str(p["_id"]): p["stock_qty"] for p in products}
+    )
 
     result = []
 
-    for product in products_collection.find({"is_active": True}):
+    for product in products:
         pid = str(product["_id"])
-        sold_qty = sales_map.get(pid, 0)
+        forecast = forecasts.get(pid)
 
-        avg_daily = sold_qty / past_days if sold_qty > 0 else 0
-        predicted = avg_daily * predict_days
+        if not forecast:
+            result.append({
+                "product_id": pid,
+                "name": product["name"],
+                "avg_daily_sales": 0,
+                "predicted_demand_next_days": 0,
+                "predicted_range": [0, 0],
+                "days_of_cover": None,
+                "current_stock": product["stock_qty"]
+            })
+            continue
 
         result.append({
             "product_id": pid,
             "name": product["name"],
-            "avg_daily_sales": round(avg_daily, 2),
-            "predicted_demand_next_days": round(predicted),
+            "avg_daily_sales": round(forecast["avg_daily"], 2),
+            "predicted_demand_next_days": round(forecast["forecast"]),
+            "predicted_range": [round(forecast["lower"]), round(forecast["upper"])],
+            "days_of_cover": (
+                round(forecast["days_of_cover"], 1)
+                if forecast["days_of_cover"] is not None else None
+            ),
             "current_stock": product["stock_qty"]
         })
 
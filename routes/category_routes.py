@@ -9,6 +9,7 @@ from utils.security import (
     get_current_user,
     admin_or_super_admin
 )
+from utils import category_cache
 
 categories_collection = db["categories"]
 
@@ -30,6 +31,7 @@ def add_category(
     categories_collection.insert_one(
         category_model(name=data.name)
     )
+    category_cache.invalidate()
     return {"message": "Category added successfully"}
 
 # ---------------- LIST CATEGORIES ----------------
@@ -66,6 +68,8 @@ def update_category(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
 
+    category_cache.invalidate()
+
     return {"message": "Category updated successfully"}
 
 # ---------------- DELETE CATEGORY ----------------
@@ -88,4 +92,6 @@ def delete_category(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
 
+    category_cache.invalidate()
+
     return {"message": "Category deleted successfully"}
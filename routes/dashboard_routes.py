@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends
-from collections import defaultdict
 from datetime import datetime, timedelta
-from bson import ObjectId
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from database import db
 from utils.security import get_current_user
+from utils.single_flight import coalesce
+from utils.sales_rollup import day_start
 
 users_collection = db["users"]
 categories_collection = db["categories"]
@@ -11,94 +13,215 @@ products_collection = db["products"]
 sales_collection = db["sales"]
 purchases_collection = db["purchases"]
 expenses_collection = db["expenses"]
+sales_daily_collection = db["sales_daily"]
 
 router = APIRouter(
     prefix="/dashboard",
     tags=["Dashboard"]
 )
 
-# ---------------- DASHBOARD SUMMARY ----------------
-@router.get("/summary")
-def dashboard_summary(user=Depends(get_current_user)):
-    total_admins = users_collection.count_documents(
-        {"role": {"$in": ["admin", "super_admin"]}}
-    )
-    total_staff = users_collection.count_documents({"role": "staff"})
+# ---------------- AGGREGATION HELPERS ----------------
+# Each helper is one server-side round trip returning only counts/sums.
+# The overview runs them concurrently since they hit independent
+# collections.
+_executor = ThreadPoolExecutor(max_workers=6, thread_name_prefix="dashboard")
 
-    total_categories = categories_collection.count_documents({"is_active": True})
-    total_products = products_collection.count_documents({"is_active": True})
 
-    purchase_qty = sum(p.get("qty", 0) for p in purchases_collection.find())
+def _period_starts():
+    now = datetime.utcnow()
+    today_start = datetime(now.year, now.month, now.day)
+    week_start = today_start - timedelta(days=now.weekday())
+    month_start = datetime(now.year, now.month, 1)
+    return today_start, week_start, month_start
 
-    total_sales = sales_collection.count_documents({})
-    total_revenue = sum(s.get("total_amount", 0) for s in sales_collection.find())
 
-    # Calculate total expenses
-    pipeline = [
+def _first(rows, field, default=0):
+    return rows[0][field] if rows else default
+
+
+def user_counts():
+    roles = {
+        row["_id"]: row["count"]
+        for row in users_collection.aggregate([
+            {"$group": {"_id": "$role", "count": {"$sum": 1}}}
+        ])
+    }
+    return {
+        "admins": roles.get("ADMIN", 0) + roles.get("SUPER_ADMIN", 0),
+        "staff": roles.get("STAFF", 0)
+    }
+
+
+def catalog_counts():
+    return {
+        "categories": categories_collection.count_documents({"is_active": True}),
+        "products": products_collection.count_documents({"is_active": True})
+    }
+
+
+def purchase_totals():
+    rows = list(purchases_collection.aggregate([
         {"$match": {"is_active": True}},
-        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-    ]
-    expense_result = list(expenses_collection.aggregate(pipeline))
-    total_expenses = expense_result[0]["total"] if expense_result else 0
+        {"$group": {
+            "_id": None,
+            "qty": {"$sum": {"$sum": "$items.qty"}},
+            "amount": {"$sum": "$total_amount"},
+            "count": {"$sum": 1}
+        }}
+    ]))
+    return {
+        "purchase_qty": _first(rows, "qty"),
+        "purchase_amount": _first(rows, "amount"),
+        "purchase_count": _first(rows, "count")
+    }
+
 
+def sales_totals():
+    # exact all-time figures straight from sales, one round trip
+    rows = list(sales_collection.aggregate([
+        {"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "revenue": {"$sum": "$total_amount"}
+        }}
+    ]))
     return {
-        "admins": total_admins,
-        "staff": total_staff,
-        "categories": total_categories,
-        "products": total_products,
-        "purchase_qty": purchase_qty,
-        "total_sales": total_sales,
-        "total_revenue": total_revenue,
-        "total_expenses": total_expenses
+        "total_sales": _first(rows, "count"),
+        "total_revenue": _first(rows, "revenue")
     }
 
 
-# ---------------- SALES ANALYSIS ----------------
-@router.get("/sales-analysis")
-def sales_analysis(user=Depends(get_current_user)):
-    now = datetime.utcnow()
-    today_start = datetime(now.year, now.month, now.day)
-    week_start = today_start - timedelta(days=now.weekday())
-    month_start = datetime(now.year, now.month, 1)
+def period_sales():
+    today_start, week_start, month_start = _period_starts()
+
+    def window(start):
+        return [
+            {"$match": {"created_at": {"$gte": start}}},
+            {"$group": {"_id": None, "total": {"$sum": "$total_amount"}}}
+        ]
+
+    facets = list(sales_collection.aggregate([
+        {"$match": {"created_at": {"$gte": min(week_start, month_start)}}},
+        {"$facet": {
+            "daily": window(today_start),
+            "weekly": window(week_start),
+            "monthly": window(month_start)
+        }}
+    ]))[0]
+
+    return {
+        "daily_sales": _first(facets["daily"], "total"),
+        "weekly_sales": _first(facets["weekly"], "total"),
+        "monthly_sales": _first(facets["monthly"], "total")
+    }
+
+
+def expense_totals():
+    rows = list(expenses_collection.aggregate([
+        {"$match": {"is_active": True}},
+        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+    ]))
+    return {"total_expenses": _first(rows, "total")}
+
+
+def _run_concurrently(*helpers):
+    result = {}
+    for future in [_executor.submit(helper) for helper in helpers]:
+        result.update(future.result())
+    return result
+
 
-    daily = weekly = monthly = 0
+# ---------------- DASHBOARD OVERVIEW ----------------
+# Everything the dashboard header needs in one call
+@router.get("/overview")
+@coalesce()
+def dashboard_overview(user=Depends(get_current_user)):
+    return _run_concurrently(
+        user_counts,
+        catalog_counts,
+        purchase_totals,
+        sales_totals,
+        period_sales,
+        expense_totals
+    )
 
-    for sale in sales_collection.find():
-        created = sale["created_at"]
-        amount = sale.get("total_amount", 0)
 
-        if created >= today_start:
-            daily += amount
-        if created >= week_start:
-            weekly += amount
-        if created >= month_start:
-            monthly += amount
+# ---------------- DASHBOARD SUMMARY ----------------
+@router.get("/summary")
+@coalesce()
+def dashboard_summary(user=Depends(get_current_user)):
+    overview = _run_concurrently(
+        user_counts,
+        catalog_counts,
+        purchase_totals,
+        sales_totals,
+        expense_totals
+    )
 
     return {
-        "daily_sales": daily,
-        "weekly_sales": weekly,
-        "monthly_sales": monthly
+        "admins": overview["admins"],
+        "staff": overview["staff"],
+        "categories": overview["categories"],
+        "products": overview["products"],
+        "purchase_qty": overview["purchase_qty"],
+        "total_sales": overview["total_sales"],
+        "total_revenue": overview["total_revenue"],
+        "total_expenses": overview["total_expenses"]
     }
 
 
+# ---------------- SALES ANALYSIS ----------------
+@router.get("/sales-analysis")
+@coalesce()
+def sales_analysis(user=Depends(get_current_user)):
+    return period_sales()
+
+
 # ---------------- TOP SELLING PRODUCTS ----------------
+# Top K computed and joined in the database from the sales_daily rollup.
+# days limits the window (all time if omitted), category is a category id.
 @router.get("/top-products")
-def top_selling_products(user=Depends(get_current_user)):
-    sales_map = defaultdict(int)
-
-    for sale in sales_collection.find():
-        for item in sale["items"]:
-            sales_map[item["product_id"]] += item["qty"]
-
-    result = []
-    for product_id, qty in sales_map.items():
-        product = products_collection.find_one({"_id": ObjectId(product_id)})
-        if product:
-            result.append({
-                "product_id": product_id,
-                "name": product["name"],
-                "sold_qty": qty
-            })
-
-    result.sort(key=lambda x: x["sold_qty"], reverse=True)
-    return result
+@coalesce()
+def top_selling_products(
+    limit: int = 10,
+    days: Optional[int] = None,
+    category: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    match = {}
+
+    if days:
+        match["day"] = {"$gte": day_start(datetime.utcnow() - timedelta(days=days))}
+
+    if category:
+        match["product_id"] = {
+            "$in": [
+                str(p["_id"])
+                for p in products_collection.find({"category_id": category}, {"_id": 1})
+            ]
+        }
+
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$product_id", "sold_qty": {"$sum": "$qty"}}},
+        {"$sort": {"sold_qty": -1, "_id": 1}},
+        {"$limit": max(1, min(limit, 100))},
+        {"$lookup": {
+            "from": "products",
+            "let": {"pid": {"$toObjectId": "$_id"}},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$pid"]}}},
+                {"$project": {"name": 1}}
+            ],
+            "as": "product"
+        }},
+        {"$unwind": "$product"},
+        {"$project": {
+            "_id": 0,
+            "product_id": "$_id",
+            "name": "$product.name",
+            "sold_qty": 1
+        }}
+    ]
+
+    return list(sales_daily_collection.aggregate(pipeline))
@@ -1,41 +1,39 @@
 from fastapi import APIRouter
-from fastapi.responses import FileResponse
+from fastapi.responses import Response
 from database import db
-from bson import ObjectId
-import pandas as pd
+from utils.category_cache import category_name
+from utils.excel_utils import build_workbook_buffer
 
 router = APIRouter(
     tags=["Excel"]
 )
 
 products_collection = db["products"]
-categories_collection = db["categories"]
 
 @router.get("/download-products")
 def download_products_excel():
-    data = []
-
     # Fetch all active products
-    for p in products_collection.find({"is_active": True}):
-        # Fetch category name
-        category = categories_collection.find_one({"_id": ObjectId(p["category_id"])})
-        
-        data.append({
-            "Product Name": p["name"],
-            "Category": category["name"] if category else "N/A",
-            "Barcode": p["barcode"],
-            "Selling Price": p["selling_price"]
-        })
+    products = products_collection.find(
+        {"is_active": True},
+        {"name": 1, "category_id": 1, "barcode": 1, "selling_price": 1}
+    ).batch_size(1000)
 
-    if not data:
+    if not products_collection.find_one({"is_active": True}, {"_id": 1}):
         return {"message": "No products found to export"}
 
-    df = pd.DataFrame(data)
-    FILE_PATH = "product_barcodes.xlsx"
-    df.to_excel(FILE_PATH, index=False)
+    # Built in memory per request, so concurrent downloads never share a file
+    buffer = build_workbook_buffer(
+        [
+            p["name"],
+            category_name(p["category_id"], "N/A"),
+            p["barcode"],
+            p["selling_price"]
+        ]
+        for p in products
+    )
 
-    return FileResponse(
-        path=FILE_PATH,
-        filename="product_barcodes.xlsx",
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    return Response(
+        content=buffer.getvalue(),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": 'attachment; filename="product_barcodes.xlsx"'}
     )
@@ -2,10 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException
 from bson import ObjectId
 from bson.errors import InvalidId
 from datetime import datetime
+from typing import Optional
 from database import db
 from schemas.expense_schema import ExpenseCreateSchema, ExpenseUpdateSchema
 from models.expense_model import expense_model
 from utils.security import admin_or_super_admin
+from utils.streaming import stream_cursor
 
 # Collection
 expenses_collection = db["expenses"]
@@ -38,12 +40,23 @@ def add_expense(
         raise HTTPException(status_code=400, detail=f"Failed to add expense: {str(e)}")
 
 @router.get("/list")
-def list_expenses(user=Depends(admin_or_super_admin)):
+def list_expenses(
+    stream: Optional[str] = None,
+    user=Depends(admin_or_super_admin)
+):
+    def expense_row(expense):
+        expense["_id"] = str(expense["_id"])
+        return expense
+
     try:
-        expenses = list(expenses_collection.find({"is_active": True}))
-        for expense in expenses:
-            expense["_id"] = str(expense["_id"])
-        return expenses
+        expenses = expenses_collection.find({"is_active": True})
+
+        if stream:
+            return stream_cursor(expenses, expense_row, stream)
+
+        return [expense_row(expense) for expense in expenses]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch expenses: {str(e)}")
 
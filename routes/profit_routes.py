@@ -1,44 +1,90 @@
 from fastapi import APIRouter, Depends
+from datetime import datetime
+from typing import Optional
 from database import db
-from bson import ObjectId
 from utils.security import get_current_user
-from collections import defaultdict
+from utils.single_flight import coalesce
+from utils.sales_rollup import day_start
 
-sales_collection = db["sales"]
 products_collection = db["products"]
+sales_daily_collection = db["sales_daily"]
 
 router = APIRouter(
     prefix="/profit",
     tags=["Profit"]
 )
 
+# Profit = revenue - cost at the time of sale, both summed from the
+# sales_daily rollup (sale lines carry the unit cost stamped at checkout).
+# from_date / to_date are inclusive days, category is a category id.
 @router.get("/product-wise")
-def product_wise_profit(user=Depends(get_current_user)):
-    sold_qty_map = defaultdict(int)
+@coalesce()
+def product_wise_profit(
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    category: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    match = {}
 
-    # collect sold quantity per product
-    for sale in sales_collection.find():
-        for item in sale["items"]:
-            sold_qty_map[item["product_id"]] += item["qty"]
+    if from_date or to_date:
+        match["day"] = {}
+        if from_date:
+            match["day"]["$gte"] = day_start(from_date)
+        if to_date:
+            match["day"]["$lte"] = day_start(to_date)
 
-    result = []
-    total_profit = 0
+    if category:
+        match["product_id"] = {
+            "$in": [
+                str(p["_id"])
+                for p in products_collection.find({"category_id": category}, {"_id": 1})
+            ]
+        }
 
-    for product_id, sold_qty in sold_qty_map.items():
-        product = products_collection.find_one({"_id": ObjectId(product_id)})
-        if not product:
-            continue
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": "$product_id",
+            "sold_qty": {"$sum": "$qty"},
+            "revenue": {"$sum": "$revenue"},
+            "cost": {"$sum": {"$ifNull": ["$cost", 0]}},
+            # rollup rows written before cost was tracked
+            "uncosted_qty": {"$sum": {"$cond": [
+                {"$eq": [{"$type": "$cost"}, "missing"]}, "$qty", 0
+            ]}}
+        }},
+        {"$lookup": {
+            "from": "products",
+            "let": {"pid": {"$toObjectId": "$_id"}},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$pid"]}}},
+                {"$project": {"name": 1, "purchase_price": 1}}
+            ],
+            "as": "product"
+        }},
+        {"$unwind": "$product"},
+        {"$set": {
+            "cost": {"$add": [
+                "$cost",
+                {"$multiply": ["$uncosted_qty", "$product.purchase_price"]}
+            ]}
+        }},
+        {"$project": {
+            "_id": 0,
+            "product_id": "$_id",
+            "product_name": "$product.name",
+            "sold_qty": 1,
+            "revenue": 1,
+            "cost": 1,
+            "profit": {"$subtract": ["$revenue", "$cost"]}
+        }},
+        {"$sort": {"profit": -1, "product_id": 1}}
+    ]
 
-        profit = (product["selling_price"] - product["purchase_price"]) * sold_qty
-        total_profit += profit
-
-        result.append({
-            "product_name": product["name"],
-            "sold_qty": sold_qty,
-            "profit": profit
-        })
+    result = list(sales_daily_collection.aggregate(pipeline))
 
     return {
-        "total_profit": total_profit,
+        "total_profit": sum(row["profit"] for row in result),
         "product_wise_profit": result
     }
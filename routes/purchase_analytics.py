@@ -1,10 +1,10 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from datetime import datetime, timedelta
 from collections import defaultdict
-from bson import ObjectId
 
 from database import db
 from utils.security import admin_or_super_admin
+from utils import sales_velocity
 
 purchases_collection = db["purchases"]
 products_collection = db["products"]
@@ -73,6 +73,8 @@ def purchase_chart(
 
 # -------------------------------------------------
 # 5️⃣ AI PURCHASE SUGGESTIONS 🤖
+# Need is predicted from sales velocity (what actually drains stock);
+# the purchase rate is summed server-side for reference.
 # -------------------------------------------------
 @router.get("/ai-purchase-suggestions")
 def ai_purchase_suggestions(
@@ -80,33 +82,44 @@ def ai_purchase_suggestions(
     predict_days: int = 7,
     user=Depends(admin_or_super_admin)
 ):
-    cutoff = datetime.utcnow() - timedelta(days=days)
-    purchase_map = defaultdict(int)
+    if not 1 <= days <= sales_velocity.MAX_WINDOW_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"days must be between 1 and {sales_velocity.MAX_WINDOW_DAYS}"
+        )
 
-    for p in purchases_collection.find(
-        {"created_at": {"$gte": cutoff}, "is_active": True}
-    ):
-        for item in p["items"]:
-            purchase_map[item["product_id"]] += item["qty"]
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    purchase_map = {
+        row["_id"]: row["qty"]
+        for row in purchases_collection.aggregate([
+            {"$match": {"created_at": {"$gte": cutoff}, "is_active": True}},
+            {"$unwind": "$items"},
+            {"$group": {"_id": "$items.product_id", "qty": {"$sum": "$items.qty"}}}
+        ])
+    }
+    sales_rate = sales_velocity.avg_daily(days)
 
     result = []
 
-    for product in products_collection.find({"is_active": True}):
+    for product in products_collection.find(
+        {"is_active": True},
+        {"name": 1, "stock_qty": 1}
+    ):
         pid = str(product["_id"])
-        purchased_qty = purchase_map.get(pid, 0)
+        avg_daily_sales = sales_rate.get(pid, 0)
 
-        if purchased_qty == 0:
+        if avg_daily_sales == 0:
             continue
 
-        avg_daily_purchase = purchased_qty / days
-        predicted_need = avg_daily_purchase * predict_days
+        predicted_need = avg_daily_sales * predict_days
 
         if product["stock_qty"] < predicted_need:
             result.append({
                 "product_id": pid,
                 "product_name": product["name"],
                 "current_stock": product["stock_qty"],
-                "avg_daily_purchase": round(avg_daily_purchase, 2),
+                "avg_daily_sales": round(avg_daily_sales, 2),
+                "avg_daily_purchase": round(purchase_map.get(pid, 0) / days, 2),
                 "predicted_required_qty": round(predicted_need),
                 "suggestion": "PURCHASE"
             })
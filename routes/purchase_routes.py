@@ -1,19 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from pydantic import ValidationError
 from bson import ObjectId
 from bson.errors import InvalidId
 from datetime import datetime
+from typing import Optional
+from collections import defaultdict
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
-from database import db
+from database import db, run_in_transaction
 from schemas.purchase_schema import (
     PurchaseCreateSchema,
-    PurchaseUpdateSchema
+    PurchaseUpdateSchema,
+    PurchaseBulkSchema
 )
 from utils.security import admin_or_super_admin
+from utils.streaming import stream_cursor
+from utils.import_utils import iter_upload_rows
+from utils import product_cache
 
 # Collections
 products_collection = db["products"]
 purchases_collection = db["purchases"]
 
+# spreadsheet header -> purchase field
+BULK_COLUMN_ALIASES = {
+    "invoice": "invoice_no",
+    "invoice_number": "invoice_no",
+    "supplier": "supplier_name",
+    "product": "product_id",
+    "quantity": "qty",
+    "unit_price": "price"
+}
+
 router = APIRouter(
     prefix="/purchases",
     tags=["Purchases"]
@@ -33,6 +52,107 @@ def purchase_model(invoice_no, supplier_name, items, total_amount):
         "updated_at": None
     }
 
+# -------------------------------------------------
+# HELPERS
+# -------------------------------------------------
+def parse_product_ids(items):
+    oids = []
+    for item in items:
+        try:
+            oids.append(ObjectId(item.product_id))
+        except InvalidId:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid product id: {item.product_id}"
+            )
+    return oids
+
+
+# One $in query for all referenced products
+def ensure_products_exist(oids, session=None):
+    wanted = set(oids)
+    found = {
+        p["_id"]
+        for p in products_collection.find(
+            {"_id": {"$in": list(wanted)}, "is_active": True},
+            {"_id": 1},
+            session=session
+        )
+    }
+
+    if found != wanted:
+        raise HTTPException(
+            status_code=404,
+            detail="Product not found"
+        )
+
+
+# product ObjectId -> [qty change, cost value change], as one atomic
+# pipeline update per product:
+#     value    = on_hand * avg_cost + value change
+#     avg_cost = value / (on_hand + qty)   (kept unless both are positive)
+#     inventory_value = new stock * avg_cost
+# on_hand is stock clamped at 0: stock can go negative (a purchase deleted
+# after its units were sold), and those units carry no cost to average in.
+# stock_qty itself still moves by the raw qty.
+def stock_ops(deltas):
+    ops = []
+
+    for oid, (qty, value) in deltas.items():
+        if not qty and not value:
+            continue
+
+        on_hand = {"$max": [{"$ifNull": ["$stock_qty", 0]}, 0]}
+        avg_cost = {"$ifNull": ["$avg_cost", "$purchase_price"]}
+        costed_qty = {"$add": [on_hand, qty]}
+        new_value = {"$add": [{"$multiply": [on_hand, avg_cost]}, value]}
+
+        ops.append(UpdateOne({"_id": oid}, [
+            {"$set": {
+                "stock_qty": {"$add": [{"$ifNull": ["$stock_qty", 0]}, qty]},
+                "avg_cost": {"$cond": [
+                    {"$and": [{"$gt": [costed_qty, 0]}, {"$gt": [new_value, 0]}]},
+                    {"$divide": [new_value, costed_qty]},
+                    avg_cost
+                ]}
+            }},
+            {"$set": {
+                "inventory_value": {"$multiply": [
+                    {"$max": ["$stock_qty", 0]}, "$avg_cost"
+                ]}
+            }}
+        ]))
+
+    return ops
+
+
+DUPLICATE_KEY = 11000
+# a concurrent ingest can commit the same invoice between our existence
+# check and insert; the unique index rejects it and the batch is re-run
+INGEST_ATTEMPTS = 3
+
+
+def invoice_exists(invoice_no):
+    return HTTPException(
+        status_code=409,
+        detail=f"Invoice {invoice_no} already exists"
+    )
+
+
+# per-product [qty, value] for a list of purchase items
+def item_deltas(oids, items):
+    deltas = defaultdict(lambda: [0, 0])
+    for oid, item in zip(oids, items):
+        deltas[oid][0] += item.qty
+        deltas[oid][1] += item.qty * item.price
+    return deltas
+
+
+# cached entries carry a stock hint, which purchases move
+def invalidate_cached(oids):
+    for oid in set(oids):
+        product_cache.invalidate(product_id=oid)
+
 # -------------------------------------------------
 # ADD PURCHASE (STOCK IN)
 # -------------------------------------------------
@@ -41,35 +161,15 @@ def add_purchase(
     data: PurchaseCreateSchema,
     user=Depends(admin_or_super_admin)
 ):
-    try:
-        total_amount = 0
+    oids = parse_product_ids(data.items)
+    total_amount = sum(item.qty * item.price for item in data.items)
 
-        for item in data.items:
-            try:
-                product_oid = ObjectId(item.product_id)
-            except InvalidId:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Invalid product id: {item.product_id}"
-                )
-
-            product = products_collection.find_one({
-                "_id": product_oid,
-                "is_active": True
-            })
+    def apply_purchase(session):
+        ensure_products_exist(oids, session)
 
-            if not product:
-                raise HTTPException(
-                    status_code=404,
-                    detail="Product not found"
-                )
-
-            products_collection.update_one(
-                {"_id": product_oid},
-                {"$inc": {"stock_qty": item.qty}}
-            )
-
-            total_amount += item.qty * item.price
+        ops = stock_ops(item_deltas(oids, data.items))
+        if ops:
+            products_collection.bulk_write(ops, session=session)
 
         purchases_collection.insert_one(
             purchase_model(
@@ -77,37 +177,218 @@ def add_purchase(
                 supplier_name=data.supplier_name,
                 items=[item.dict() for item in data.items],
                 total_amount=total_amount
-            )
+            ),
+            session=session
         )
 
-        return {
-            "message": "Purchase added successfully",
-            "total_amount": total_amount
-        }
-    
+    try:
+        run_in_transaction(apply_purchase)
     except HTTPException:
         raise
+    except DuplicateKeyError:
+        raise invoice_exists(data.invoice_no)
     except Exception as e:
         raise HTTPException(
             status_code=400,
             detail=f"Purchase failed: {str(e)}"
         )
 
+    invalidate_cached(oids)
+
+    return {
+        "message": "Purchase added successfully",
+        "total_amount": total_amount
+    }
+
+# -------------------------------------------------
+# BULK PURCHASES (MANY INVOICES)
+# All invoices are validated with one product query, stock is
+# aggregated per product and committed with one bulk_write next to
+# one insert_many. An invoice_no that already exists is skipped, so
+# retrying an upload is safe.
+# -------------------------------------------------
+def ingest_invoices(invoices, rejected):
+    accepted = {}
+
+    for invoice in invoices:
+        if invoice.invoice_no in accepted:
+            rejected.append({
+                "invoice_no": invoice.invoice_no,
+                "error": "Duplicate invoice_no in upload"
+            })
+            continue
+        try:
+            accepted[invoice.invoice_no] = (invoice, parse_product_ids(invoice.items))
+        except HTTPException as e:
+            rejected.append({"invoice_no": invoice.invoice_no, "error": e.detail})
+
+    all_oids = {oid for _, oids in accepted.values() for oid in oids}
+    active = {
+        p["_id"]
+        for p in products_collection.find(
+            {"_id": {"$in": list(all_oids)}, "is_active": True},
+            {"_id": 1}
+        )
+    }
+
+    for invoice_no, (invoice, oids) in list(accepted.items()):
+        missing = [str(oid) for oid in oids if oid not in active]
+        if missing:
+            rejected.append({
+                "invoice_no": invoice_no,
+                "error": f"Product not found: {', '.join(missing)}"
+            })
+            del accepted[invoice_no]
+
+    result = {"inserted": [], "skipped": [], "total_amount": 0}
+
+    def apply_bulk(session):
+        result.update(inserted=[], skipped=[], total_amount=0)
+
+        # 🔁 IDEMPOTENCY: invoices already recorded are left alone
+        existing = {
+            p["invoice_no"]
+            for p in purchases_collection.find(
+                {"invoice_no": {"$in": list(accepted)}, "is_active": True},
+                {"invoice_no": 1},
+                session=session
+            )
+        }
+
+        docs = []
+        deltas = defaultdict(lambda: [0, 0])
+
+        for invoice_no, (invoice, oids) in accepted.items():
+            if invoice_no in existing:
+                result["skipped"].append(invoice_no)
+                continue
+
+            total_amount = sum(item.qty * item.price for item in invoice.items)
+            for oid, (qty, value) in item_deltas(oids, invoice.items).items():
+                deltas[oid][0] += qty
+                deltas[oid][1] += value
+
+            docs.append(purchase_model(
+                invoice_no=invoice.invoice_no,
+                supplier_name=invoice.supplier_name,
+                items=[item.dict() for item in invoice.items],
+                total_amount=total_amount
+            ))
+            result["inserted"].append(invoice_no)
+            result["total_amount"] += total_amount
+
+        if not docs:
+            return
+
+        purchases_collection.insert_many(docs, session=session)
+
+        ops = stock_ops(deltas)
+        if ops:
+            products_collection.bulk_write(ops, session=session)
+
+    if accepted:
+        for attempt in range(INGEST_ATTEMPTS):
+            try:
+                run_in_transaction(apply_bulk)
+                break
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                if any(err.get("code") != DUPLICATE_KEY for err in errors):
+                    raise
+                # ingested concurrently: the retry reports them as skipped
+                if attempt == INGEST_ATTEMPTS - 1:
+                    raise HTTPException(
+                        status_code=409,
+                        detail="Invoices are being ingested concurrently, retry the upload"
+                    )
+
+        invalidate_cached(oid for _, oids in accepted.values() for oid in oids)
+
+    return {
+        "message": f"Added {len(result['inserted'])} purchases",
+        "inserted": result["inserted"],
+        "skipped": result["skipped"],
+        "rejected": rejected,
+        "total_amount": result["total_amount"]
+    }
+
+
+@router.post("/bulk")
+def add_purchases_bulk(
+    data: PurchaseBulkSchema,
+    user=Depends(admin_or_super_admin)
+):
+    return ingest_invoices(data.invoices, [])
+
+
+# Columns: invoice_no, supplier_name, product_id, qty, price
+# (one row per invoice line)
+@router.post("/bulk/upload")
+def upload_purchases_bulk(
+    file: UploadFile = File(...),
+    user=Depends(admin_or_super_admin)
+):
+    grouped = {}
+    rejected = []
+
+    for row_number, row in iter_upload_rows(file, BULK_COLUMN_ALIASES):
+        invoice_no = str(row.get("invoice_no") or "").strip()
+        if not invoice_no:
+            rejected.append({"invoice_no": None, "error": f"Row {row_number}: missing invoice_no"})
+            continue
+
+        invoice = grouped.setdefault(invoice_no, {
+            "invoice_no": invoice_no,
+            "supplier_name": row.get("supplier_name"),
+            "items": [],
+            "rows": []
+        })
+        invoice["items"].append({
+            "product_id": str(row.get("product_id") or ""),
+            "qty": row.get("qty"),
+            "price": row.get("price")
+        })
+        invoice["rows"].append(row_number)
+
+    invoices = []
+    for invoice_no, invoice in grouped.items():
+        rows = invoice.pop("rows")
+        try:
+            invoices.append(PurchaseCreateSchema(**invoice))
+        except ValidationError as e:
+            rejected.append({
+                "invoice_no": invoice_no,
+                "error": f"Rows {rows[0]}-{rows[-1]}: " + "; ".join(
+                    f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}"
+                    for err in e.errors()
+                )
+            })
+
+    return ingest_invoices(invoices, rejected)
+
 # -------------------------------------------------
 # LIST PURCHASES
 # -------------------------------------------------
 @router.get("/list")
-def list_purchases(user=Depends(admin_or_super_admin)):
-    return [
-        {
+def list_purchases(
+    stream: Optional[str] = None,
+    user=Depends(admin_or_super_admin)
+):
+    def purchase_row(p):
+        return {
             "_id": str(p["_id"]),
             "invoice_no": p["invoice_no"],
             "supplier_name": p["supplier_name"],
             "total_amount": p["total_amount"],
             "created_at": p["created_at"]
         }
-        for p in purchases_collection.find({"is_active": True})
-    ]
+
+    purchases = purchases_collection.find({"is_active": True}, {"items": 0})
+
+    if stream:
+        return stream_cursor(purchases, purchase_row, stream)
+
+    return [purchase_row(p) for p in purchases]
 
 # -------------------------------------------------
 # GET PURCHASE
@@ -132,6 +413,9 @@ def get_purchase(purchase_id: str, user=Depends(admin_or_super_admin)):
 
 # -------------------------------------------------
 # UPDATE PURCHASE
+# Stock moves by the per-product net difference between the old
+# and new items, applied in one bulk_write in the same transaction
+# as the purchase update.
 # -------------------------------------------------
 @router.put("/update/{purchase_id}")
 def update_purchase(
@@ -144,63 +428,52 @@ def update_purchase(
     except InvalidId:
         raise HTTPException(400, "Invalid purchase id")
 
-    old_purchase = purchases_collection.find_one({
-        "_id": purchase_oid,
-        "is_active": True
-    })
-
-    if not old_purchase:
-        raise HTTPException(404, "Purchase not found")
+    new_oids = parse_product_ids(data.items)
+    total_amount = sum(item.qty * item.price for item in data.items)
+    touched = set()
 
-    # 🔁 REVERSE OLD STOCK
-    for item in old_purchase["items"]:
-        products_collection.update_one(
-            {"_id": ObjectId(item["product_id"])},
-            {"$inc": {"stock_qty": -item["qty"]}}
+    def apply_update(session):
+        old_purchase = purchases_collection.find_one(
+            {"_id": purchase_oid, "is_active": True},
+            session=session
         )
 
-    total_amount = 0
-
-    # 🔥 APPLY NEW STOCK
-    for item in data.items:
-        try:
-            product_oid = ObjectId(item.product_id)
-        except InvalidId:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid product id: {item.product_id}"
-            )
-
-        product = products_collection.find_one({
-            "_id": product_oid,
-            "is_active": True
-        })
-
-        if not product:
-            raise HTTPException(
-                status_code=404,
-                detail="Product not found"
-            )
-
-        products_collection.update_one(
-            {"_id": product_oid},
-            {"$inc": {"stock_qty": item.qty}}
+        if not old_purchase:
+            raise HTTPException(404, "Purchase not found")
+
+        ensure_products_exist(new_oids, session)
+
+        # 🔁 NET STOCK AND COST CHANGE PER PRODUCT (NEW - OLD)
+        deltas = item_deltas(new_oids, data.items)
+        for item in old_purchase["items"]:
+            oid = ObjectId(item["product_id"])
+            deltas[oid][0] -= item["qty"]
+            deltas[oid][1] -= item["qty"] * item["price"]
+        touched.update(deltas)
+
+        ops = stock_ops(deltas)
+        if ops:
+            products_collection.bulk_write(ops, session=session)
+
+        purchases_collection.update_one(
+            {"_id": purchase_oid},
+            {
+                "$set": {
+                    "invoice_no": data.invoice_no,
+                    "supplier_name": data.supplier_name,
+                    "items": [item.dict() for item in data.items],
+                    "total_amount": total_amount,
+                    "updated_at": datetime.utcnow()
+                }
+            },
+            session=session
         )
 
-        total_amount += item.qty * item.price
-
-    purchases_collection.update_one(
-        {"_id": purchase_oid},
-        {
-            "$set": {
-                "invoice_no": data.invoice_no,
-                "supplier_name": data.supplier_name,
-                "items": [item.dict() for item in data.items],
-                "total_amount": total_amount,
-                "updated_at": datetime.utcnow()
-            }
-        }
-    )
+    try:
+        run_in_transaction(apply_update)
+    except DuplicateKeyError:
+        raise invoice_exists(data.invoice_no)
+    invalidate_cached(touched)
 
     return {"message": "Purchase updated successfully"}
 
@@ -217,29 +490,41 @@ def delete_purchase(
     except InvalidId:
         raise HTTPException(400, "Invalid purchase id")
 
-    purchase = purchases_collection.find_one({
-        "_id": purchase_oid,
-        "is_active": True
-    })
+    touched = set()
 
-    if not purchase:
-        raise HTTPException(404, "Purchase not found")
+    def apply_delete(session):
+        purchase = purchases_collection.find_one(
+            {"_id": purchase_oid, "is_active": True},
+            session=session
+        )
 
-    # 🔁 REVERSE STOCK
-    for item in purchase["items"]:
-        products_collection.update_one(
-            {"_id": ObjectId(item["product_id"])},
-            {"$inc": {"stock_qty": -item["qty"]}}
+        if not purchase:
+            raise HTTPException(404, "Purchase not found")
+
+        # 🔁 REVERSE STOCK AND COST
+        deltas = defaultdict(lambda: [0, 0])
+        for item in purchase["items"]:
+            oid = ObjectId(item["product_id"])
+            deltas[oid][0] -= item["qty"]
+            deltas[oid][1] -= item["qty"] * item["price"]
+        touched.update(deltas)
+
+        ops = stock_ops(deltas)
+        if ops:
+            products_collection.bulk_write(ops, session=session)
+
+        purchases_collection.update_one(
+            {"_id": purchase_oid},
+            {
+                "$set": {
+                    "is_active": False,
+                    "updated_at": datetime.utcnow()
+                }
+            },
+            session=session
         )
 
-    purchases_collection.update_one(
-        {"_id": purchase_oid},
-        {
-            "$set": {
-                "is_active": False,
-                "updated_at": datetime.utcnow()
-            }
-        }
-    )
+    run_in_transaction(apply_delete)
+    invalidate_cached(touched)
 
     return {"message": "Purchase deleted successfully"}
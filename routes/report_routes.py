@@ -1,27 +1,108 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from datetime import datetime, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import re
 from database import db
 from utils.security import get_current_user
 
 sales_collection = db["sales"]
 
+GRANULARITIES = ("hour", "day", "week", "month")
+# UTC offsets accepted by $dateTrunc next to Olson names
+UTC_OFFSET = re.compile(r"^[+-]\d{2}(:?\d{2})?$")
+
 router = APIRouter(
     prefix="/reports",
     tags=["Reports"]
 )
 
+# Total and bill count for created_at in [start, end), computed
+# server-side over the created_at index
+def sales_totals(start, end):
+    result = list(sales_collection.aggregate([
+        {"$match": {"created_at": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": None,
+            "total": {"$sum": "$total_amount"},
+            "bills": {"$sum": 1}
+        }}
+    ]))
+
+    if not result:
+        return 0, 0
+    return result[0]["total"], result[0]["bills"]
+
+# ---------------- SALES REPORT (ANY RANGE) ----------------
+# /reports/sales?from=2024-06-01&to=2024-07-01&granularity=day
+@router.get("/sales")
+def sales_report(
+    from_date: datetime = Query(..., alias="from"),
+    to_date: Optional[datetime] = Query(None, alias="to"),
+    granularity: str = "day",
+    timezone: str = "UTC",
+    user=Depends(get_current_user)
+):
+    if granularity not in GRANULARITIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"granularity must be one of: {', '.join(GRANULARITIES)}"
+        )
+
+    if not UTC_OFFSET.match(timezone):
+        try:
+            ZoneInfo(timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown timezone: {timezone}"
+            )
+
+    to_date = to_date or datetime.utcnow()
+
+    bucket = {
+        "date": "$created_at",
+        "unit": granularity,
+        "timezone": timezone
+    }
+    if granularity == "week":
+        bucket["startOfWeek"] = "monday"
+
+    buckets = list(sales_collection.aggregate([
+        {"$match": {"created_at": {"$gte": from_date, "$lt": to_date}}},
+        {"$group": {
+            "_id": {"$dateTrunc": bucket},
+            "total_sales": {"$sum": "$total_amount"},
+            "bill_count": {"$sum": 1}
+        }},
+        {"$sort": {"_id": 1}}
+    ]))
+
+    return {
+        "from": from_date,
+        "to": to_date,
+        "granularity": granularity,
+        "total_sales": sum(b["total_sales"] for b in buckets),
+        "bill_count": sum(b["bill_count"] for b in buckets),
+        "buckets": [
+            {
+                "period": b["_id"],
+                "total_sales": b["total_sales"],
+                "bill_count": b["bill_count"]
+            }
+            for b in buckets
+        ]
+    }
+
 # ---------------- DAILY SALES ----------------
 @router.get("/daily-sales")
 def daily_sales(user=Depends(get_current_user)):
-    today = datetime.utcnow().date()
-    total = 0
-
-    for sale in sales_collection.find():
-        if sale["created_at"].date() == today:
-            total += sale["total_amount"]
+    now = datetime.utcnow()
+    today = datetime(now.year, now.month, now.day)
+    total, _ = sales_totals(today, today + timedelta(days=1))
 
     return {
-        "date": str(today),
+        "date": str(today.date()),
         "total_sales": total
     }
 
@@ -29,11 +110,9 @@ def daily_sales(user=Depends(get_current_user)):
 @router.get("/monthly-sales")
 def monthly_sales(user=Depends(get_current_user)):
     now = datetime.utcnow()
-    total = 0
-
-    for sale in sales_collection.find():
-        if sale["created_at"].year == now.year and sale["created_at"].month == now.month:
-            total += sale["total_amount"]
+    month_start = datetime(now.year, now.month, 1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    total, _ = sales_totals(month_start, next_month)
 
     return {
         "month": f"{now.year}-{now.month}",
@@ -1,92 +1,243 @@
 from fastapi import APIRouter, Depends, HTTPException
-from database import db
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+from pymongo import UpdateOne
+from database import db, run_in_transaction
 from models.sales_model import sales_model
 from schemas.sales_schema import SalesCreateSchema
 from utils.security import get_current_user
+from utils import product_cache, sales_rollup, sales_velocity
+from utils.pagination import fetch_page, keyset_filter
+from utils.streaming import stream_cursor
 from bson import ObjectId
 products_collection = db["products"]
 sales_collection = db["sales"]
 
+class InsufficientStock(Exception):
+    pass
+
 router = APIRouter(
     prefix="/sales",
     tags=["Sales"]
 )
 
 # ---------------- ADD SALE (STOCK OUT - BARCODE) ----------------
+# One $in lookup for the whole cart, then every stock decrement in a
+# single bulk_write. Each decrement is guarded by stock_qty >= qty and
+# runs in the same transaction as the sale insert, so two tills selling
+# the last unit cannot both succeed. The sales_daily rollup is updated
+# in the same transaction.
 @router.post("/add")
 def add_sale(
     data: SalesCreateSchema,
     user=Depends(get_current_user)   # Staff / Admin / Super Admin
 ):
-    total_amount = 0
-    sales_items = []
-
+    # 🧮 MERGE REPEATED SCANS OF THE SAME BARCODE
+    cart = OrderedDict()
     for item in data.items:
-        # 🔍 FIND PRODUCT BY BARCODE
-        product = products_collection.find_one({
-            "barcode": item.barcode,
-            "is_active": True
-        })
+        cart[item.barcode] = cart.get(item.barcode, 0) + item.qty
 
-        if not product:
+    # 🔍 FIND ALL PRODUCTS (CACHE, THEN ONE QUERY FOR MISSES)
+    products = product_cache.get_many(list(cart))
+
+    for barcode in cart:
+        if barcode not in products:
             raise HTTPException(
                 status_code=404,
-                detail=f"Product not found for barcode {item.barcode}"
+                detail=f"Product not found for barcode {barcode}"
             )
 
-        # ❌ PREVENT NEGATIVE STOCK
-        if product["stock_qty"] < item.qty:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient stock for {product['name']}"
-            )
+    total_amount = 0
+    sales_items = []
+    stock_ops = []
 
-        # 🔽 STOCK OUT
-        products_collection.update_one(
-            {"_id": product["_id"]},
-            {"$inc": {"stock_qty": -item.qty}}
-        )
+    for barcode, qty in cart.items():
+        product = products[barcode]
+
+        # 🔽 STOCK OUT (❌ PREVENT NEGATIVE STOCK)
+        stock_ops.append(UpdateOne(
+            {
+                "_id": ObjectId(product["id"]),
+                "is_active": True,
+                "stock_qty": {"$gte": qty}
+            },
+            # stock leaves at avg_cost, so inventory_value stays
+            # stock_qty * avg_cost
+            [
+                {"$set": {"stock_qty": {"$subtract": ["$stock_qty", qty]}}},
+                {"$set": {"inventory_value": {"$multiply": [
+                    "$stock_qty",
+                    {"$ifNull": ["$avg_cost", "$purchase_price"]}
+                ]}}}
+            ]
+        ))
 
-        amount = product["selling_price"] * item.qty
+        amount = product["selling_price"] * qty
         total_amount += amount
 
         sales_items.append({
-            "product_id": str(product["_id"]),
-            "barcode": item.barcode,
-            "qty": item.qty,
+            "product_id": product["id"],
+            "barcode": barcode,
+            "qty": qty,
             "price": product["selling_price"]
         })
 
-    sales_collection.insert_one(
-        sales_model(
-            bill_no=data.bill_no,
-            items=sales_items,
-            total_amount=total_amount,
-            payment_mode=data.payment_mode,
-            created_by=user["user_id"]
-        )
+    sale = sales_model(
+        bill_no=data.bill_no,
+        items=sales_items,
+        total_amount=total_amount,
+        payment_mode=data.payment_mode,
+        created_by=user["user_id"]
     )
+    # counted by sales_rollup.apply_sale below; the one-time history
+    # backfill skips sales carrying this flag
+    sale["rolled_up"] = True
+
+    def checkout(session):
+        result = products_collection.bulk_write(stock_ops, session=session)
+
+        if result.matched_count != len(stock_ops):
+            raise InsufficientStock()
+
+        # 💰 COST AT SALE: read after the stock update, in the same
+        # transaction, so a concurrent purchase moving avg_cost conflicts
+        # instead of leaving a stale cost on the bill
+        costs = {
+            str(p["_id"]): p.get("avg_cost", p.get("purchase_price", 0))
+            for p in products_collection.find(
+                {"_id": {"$in": [ObjectId(item["product_id"]) for item in sales_items]}},
+                {"avg_cost": 1, "purchase_price": 1},
+                session=session
+            )
+        }
+        for item in sales_items:
+            item["unit_cost"] = costs[item["product_id"]]
+
+        sales_collection.insert_one(sale, session=session)
+        sales_rollup.apply_sale(sale, session=session)
+
+    try:
+        run_in_transaction(checkout)
+    except InsufficientStock:
+        # cached entries may be stale (deleted in another worker)
+        for barcode in cart:
+            product_cache.invalidate(barcode=barcode)
+
+        barcode_by_id = {p["id"]: barcode for barcode, p in products.items()}
+        current = {
+            str(p["_id"]): p
+            for p in products_collection.find(
+                {"_id": {"$in": [ObjectId(pid) for pid in barcode_by_id]}},
+                {"name": 1, "is_active": 1, "stock_qty": 1}
+            )
+        }
+
+        # resolved from a stale cache entry: deleted since it was cached
+        for pid, barcode in barcode_by_id.items():
+            if pid not in current or not current[pid].get("is_active", True):
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Product not found for barcode {barcode}"
+                )
+
+        # transaction is rolled back here, so any line whose stock is
+        # below its qty is one that failed the guard
+        short = [
+            p["name"]
+            for pid, p in current.items()
+            if p.get("stock_qty", 0) < cart[barcode_by_id[pid]]
+        ]
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient stock for {', '.join(short)}"
+        )
+
+    for barcode, qty in cart.items():
+        product_cache.adjust_stock(barcode, -qty)
+    sales_velocity.bump_version()
 
     return {
         "message": "Sale completed successfully",
         "total_amount": total_amount
     }
 # ---------------- LIST SALES ----------------
+# Without limit/cursor: a plain list of every matching sale, newest first
+# (the original contract).
+# With limit and/or cursor: keyset-paginated on (created_at, _id) and
+# returned as {count, next_cursor, sales}; pass next_cursor from the
+# previous page as `cursor` to continue.
+# With ?stream=ndjson|json every matching sale is streamed instead
+# (limit is ignored).
+DEFAULT_PAGE_SIZE = 50
+
+
 @router.get("/list")
-def list_sales(user=Depends(get_current_user)):
-    result = []
+def list_sales(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    created_by: Optional[str] = None,
+    payment_mode: Optional[str] = None,
+    include_items: bool = True,
+    stream: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    query = {}
+
+    if from_date or to_date:
+        query["created_at"] = {}
+        if from_date:
+            query["created_at"]["$gte"] = from_date
+        if to_date:
+            query["created_at"]["$lt"] = to_date
+    if created_by:
+        query["created_by"] = created_by
+    if payment_mode:
+        query["payment_mode"] = payment_mode
+    if cursor:
+        query = {"$and": [query, keyset_filter(cursor)]}
 
-    for sale in sales_collection.find().sort("created_at", -1):
-        result.append({
+    projection = None if include_items else {"items": 0}
+
+    def sale_row(sale):
+        row = {
             "id": str(sale["_id"]),
             "bill_no": sale["bill_no"],
-            "items": sale["items"],
             "total_amount": sale["total_amount"],
             "payment_mode": sale["payment_mode"],
             "created_at": sale["created_at"]
-        })
+        }
+        if include_items:
+            row["items"] = sale["items"]
+        return row
+
+    if stream:
+        return stream_cursor(
+            sales_collection.find(query, projection)
+            .sort([("created_at", -1), ("_id", -1)]),
+            sale_row,
+            stream
+        )
+
+    if limit is None and cursor is None:
+        return [
+            sale_row(sale)
+            for sale in sales_collection.find(query, projection)
+            .sort([("created_at", -1), ("_id", -1)])
+        ]
 
-    return result
+    sales, next_cursor = fetch_page(
+        sales_collection, query, limit or DEFAULT_PAGE_SIZE, projection
+    )
+    result = [sale_row(sale) for sale in sales]
+
+    return {
+        "count": len(result),
+        "next_cursor": next_cursor,
+        "sales": result
+    }
 # ---------------- SALE DETAILS ----------------
 @router.get("/details/{sale_id}")
 def sale_details(
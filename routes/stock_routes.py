@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Depends
+from typing import Optional
 from database import db
 from utils.security import get_current_user
+from utils.streaming import stream_cursor
+from utils.category_cache import category_name
 
 products_collection = db["products"]
 
@@ -11,17 +14,26 @@ router = APIRouter(
 
 # ---------------- STOCK SUMMARY ----------------
 @router.get("/summary")
-def stock_summary(user=Depends(get_current_user)):
-    result = []
-
-    for p in products_collection.find({"is_active": True}):
-        result.append({
+def stock_summary(
+    stream: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    def stock_row(p):
+        return {
             "product_id": str(p["_id"]),
             "name": p["name"],
             "stock_qty": p["stock_qty"]
-        })
+        }
 
-    return result
+    products = products_collection.find(
+        {"is_active": True},
+        {"name": 1, "stock_qty": 1}
+    )
+
+    if stream:
+        return stream_cursor(products, stock_row, stream)
+
+    return [stock_row(p) for p in products]
 
 
 # ---------------- LOW STOCK ALERT ----------------
@@ -43,3 +55,42 @@ def low_stock_alert(
         })
 
     return result
+
+
+# ---------------- STOCK VALUATION ----------------
+# Reads the inventory_value kept on each product by purchases and sales
+# (stock_qty * avg_cost for products that predate the ledger).
+@router.get("/valuation")
+def stock_valuation(user=Depends(get_current_user)):
+    rows = products_collection.aggregate([
+        {"$match": {"is_active": True}},
+        {"$group": {
+            "_id": "$category_id",
+            "products": {"$sum": 1},
+            "stock_qty": {"$sum": "$stock_qty"},
+            "inventory_value": {"$sum": {"$ifNull": [
+                "$inventory_value",
+                {"$multiply": [
+                    {"$max": ["$stock_qty", 0]},
+                    {"$ifNull": ["$avg_cost", "$purchase_price"]}
+                ]}
+            ]}}
+        }},
+        {"$sort": {"inventory_value": -1}}
+    ])
+
+    categories = [
+        {
+            "category_id": row["_id"],
+            "category_name": category_name(row["_id"], "Unknown"),
+            "products": row["products"],
+            "stock_qty": row["stock_qty"],
+            "inventory_value": round(row["inventory_value"], 2)
+        }
+        for row in rows
+    ]
+
+    return {
+        "total_value": round(sum(c["inventory_value"] for c in categories), 2),
+        "categories": categories
+    }
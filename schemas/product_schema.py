@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List
 
 class ProductCreateSchema(BaseModel):
     name: str = Field(..., example="Plastic Bucket")
@@ -17,6 +17,9 @@ class ProductUpdateSchema(BaseModel):
     stock_qty: Optional[int] = None
     is_active: Optional[bool] = None
 
+class BarcodeLookupSchema(BaseModel):
+    barcodes: List[str] = Field(..., example=["4821", "0937"])
+
 class ProductResponseSchema(BaseModel):
     id: str
     name: str
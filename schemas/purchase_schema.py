@@ -18,3 +18,7 @@ class PurchaseUpdateSchema(BaseModel):
     invoice_no: str
     supplier_name: str
     items: List[PurchaseItemSchema]
+
+# ---------------- BULK PURCHASES ----------------
+class PurchaseBulkSchema(BaseModel):
+    invoices: List[PurchaseCreateSchema]
@@ -0,0 +1,186 @@
+# utils/ai_jobs.py
+# Background generation of AI suggestions. POST /ai-suggestions/generate
+# records a job document and hands its id to an in-process asyncio queue;
+# one worker task runs the (slow) analysis + LLM call in the threadpool
+# and stores the outcome on the job for GET /ai-suggestions/jobs/{id}.
+#
+# While a job is queued or running it holds active_key (the UTC day) under
+# a unique sparse index, so repeated clicks attach to the running job
+# instead of starting parallel LLM calls.
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
+
+from database import db
+from models.ai_suggestion_model import ai_suggestion_model
+from utils.ai_service import AIBusinessAnalyzer
+
+ai_suggestions_collection = db["ai_suggestions"]
+ai_jobs_collection = db["ai_suggestion_jobs"]
+
+# a job still active after this long belongs to a worker that died
+JOB_STALE_SECONDS = 15 * 60
+INSERT_ATTEMPTS = 5
+
+_queue = None
+_loop = None
+
+
+def _active_key(now):
+    return now.strftime("%Y-%m-%d")
+
+
+def job_view(job):
+    return {
+        "job_id": str(job["_id"]),
+        "status": job["status"],    # queued, running, done, failed
+        "created_at": job["created_at"],
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+        "result": job.get("result"),
+        "error": job.get("error")
+    }
+
+
+def _finish(job_id, **fields):
+    ai_jobs_collection.update_one(
+        {"_id": job_id},
+        {
+            "$set": {**fields, "finished_at": datetime.utcnow()},
+            "$unset": {"active_key": ""}
+        }
+    )
+
+
+def _clear_stale(now):
+    ai_jobs_collection.update_many(
+        {
+            "active_key": {"$exists": True},
+            "created_at": {"$lt": now - timedelta(seconds=JOB_STALE_SECONDS)}
+        },
+        {
+            "$set": {"status": "failed", "error": "Job abandoned", "finished_at": now},
+            "$unset": {"active_key": ""}
+        }
+    )
+
+
+# -------------------------------------------------
+# ENQUEUE
+# -------------------------------------------------
+def submit_job(user_id, force=False):
+    """
+    Returns (job, created). Without force, today's running job or the
+    last job finished today is returned instead of starting a new one.
+    """
+    now = datetime.utcnow()
+    key = _active_key(now)
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    _clear_stale(now)
+
+    if not force:
+        done_today = ai_jobs_collection.find_one(
+            {"status": "done", "created_at": {"$gte": today_start}},
+            sort=[("created_at", -1)]
+        )
+        if done_today:
+            return done_today, False
+
+    job = {
+        "status": "queued",
+        "active_key": key,
+        "created_by": user_id,
+        "created_at": now
+    }
+
+    # the active job can finish between a failed insert and the lookup,
+    # and another click can take the key again, so retry a few times
+    for _ in range(INSERT_ATTEMPTS):
+        job.pop("_id", None)
+        try:
+            ai_jobs_collection.insert_one(job)
+            break
+        except DuplicateKeyError:
+            active = ai_jobs_collection.find_one({"active_key": key})
+            if active:
+                return active, False
+    else:
+        raise RuntimeError("Could not start or find today's suggestion job")
+
+    # routes run in the threadpool; the queue belongs to the event loop
+    _loop.call_soon_threadsafe(_queue.put_nowait, job["_id"])
+    return job, True
+
+
+def get_job(job_id: ObjectId):
+    return ai_jobs_collection.find_one({"_id": job_id})
+
+
+# -------------------------------------------------
+# WORKER
+# -------------------------------------------------
+def _generate(job_id):
+    suggestions = AIBusinessAnalyzer.generate_suggestions()
+
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    existing_today = ai_suggestions_collection.count_documents({
+        "created_at": {"$gte": today_start},
+        "is_active": True
+    })
+
+    if suggestions:
+        ai_suggestions_collection.insert_many([
+            ai_suggestion_model(
+                suggestion_type=suggestion["type"],
+                title=suggestion["title"],
+                description=suggestion["description"],
+                priority=suggestion.get("priority", "medium"),
+                # LLM suggestions carry expected_impact instead
+                data_insights=suggestion.get("data_insights") or {
+                    "expected_impact": suggestion.get("expected_impact")
+                }
+            )
+            for suggestion in suggestions
+        ])
+
+    _finish(job_id, status="done", result={
+        "message": f"Generated {len(suggestions)} new suggestions",
+        "suggestions": suggestions,
+        "existing_today": existing_today
+    })
+
+
+async def _worker():
+    while True:
+        job_id = await _queue.get()
+        try:
+            job = await run_in_threadpool(
+                ai_jobs_collection.find_one_and_update,
+                {"_id": job_id, "status": "queued"},
+                {"$set": {"status": "running", "started_at": datetime.utcnow()}},
+                return_document=ReturnDocument.AFTER
+            )
+            if job:
+                await run_in_threadpool(_generate, job_id)
+        except Exception as e:
+            print(f"⚠️ AI suggestion job {job_id} failed: {e}")
+            try:
+                await run_in_threadpool(_finish, job_id, status="failed", error=str(e))
+            except Exception as record_error:
+                print(f"⚠️ Could not record failure of AI job {job_id}: {record_error}")
+        finally:
+            _queue.task_done()
+
+
+def start_worker():
+    """Called from the app startup event, inside the running loop."""
+    global _queue, _loop
+
+    _loop = asyncio.get_running_loop()
+    _queue = asyncio.Queue()
+    _loop.create_task(_worker())
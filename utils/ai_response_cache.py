@@ -0,0 +1,120 @@
+# utils/ai_response_cache.py
+# Content-addressed cache for Gemini suggestion responses. The key is a
+# sha256 of the business metrics (floats rounded, keys sorted) plus the
+# model name, so an unchanged store state never pays for a second LLM call.
+# Entries live in Mongo (expired by a TTL index, shared by all workers)
+# behind a small in-process LRU.
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from pymongo.errors import PyMongoError
+
+from config import AI_CACHE_TTL_SECONDS
+from database import db
+
+ai_response_cache_collection = db["ai_response_cache"]
+
+MAX_ENTRIES = 256
+# money figures are compared to the paisa
+ROUND_DIGITS = 2
+
+_entries = OrderedDict()     # key -> (expires_at, suggestions)
+_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0}
+_lock = threading.Lock()
+
+
+def _normalize(value):
+    if isinstance(value, float):
+        return round(value, ROUND_DIGITS)
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def cache_key(business_data: dict, model_name: str) -> str:
+    payload = json.dumps(
+        {"model": model_name, "data": _normalize(business_data)},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _remember(key, suggestions, expires_at):
+    _entries[key] = (expires_at, suggestions)
+    _entries.move_to_end(key)
+    while len(_entries) > MAX_ENTRIES:
+        _entries.popitem(last=False)
+
+
+# -------------------------------------------------
+# LOOKUP / STORE
+# -------------------------------------------------
+def get(key):
+    """Cached suggestions for key, or None."""
+    with _lock:
+        cached = _entries.get(key)
+        if cached and cached[0] > time.monotonic():
+            _entries.move_to_end(key)
+            _stats["memory_hits"] += 1
+            return cached[1]
+
+    try:
+        doc = ai_response_cache_collection.find_one({"_id": key})
+    except PyMongoError as e:
+        print(f"⚠️ AI response cache unavailable: {e}")
+        doc = None
+
+    with _lock:
+        if not doc:
+            _stats["misses"] += 1
+            return None
+
+        # the TTL monitor runs about once a minute, so check age here too
+        age = (datetime.utcnow() - doc["created_at"]).total_seconds()
+        if age >= AI_CACHE_TTL_SECONDS:
+            _stats["misses"] += 1
+            return None
+
+        _stats["db_hits"] += 1
+        _remember(key, doc["suggestions"], time.monotonic() + AI_CACHE_TTL_SECONDS - age)
+        return doc["suggestions"]
+
+
+def put(key, model_name, suggestions):
+    with _lock:
+        _stats["stores"] += 1
+        _remember(key, suggestions, time.monotonic() + AI_CACHE_TTL_SECONDS)
+
+    try:
+        ai_response_cache_collection.replace_one(
+            {"_id": key},
+            {
+                "model": model_name,
+                "suggestions": suggestions,
+                "created_at": datetime.utcnow()
+            },
+            upsert=True
+        )
+    except PyMongoError as e:
+        print(f"⚠️ Could not persist AI response: {e}")
+
+
+def stats():
+    with _lock:
+        hits = _stats["memory_hits"] + _stats["db_hits"]
+        lookups = hits + _stats["misses"]
+        return {
+            **_stats,
+            "hits": hits,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "memory_entries": len(_entries),
+            "ttl_seconds": AI_CACHE_TTL_SECONDS
+        }
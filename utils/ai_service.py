@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 from database import db
 from typing import List, Dict
+from utils import sales_velocity, rule_engine
 
 products_collection = db["products"]
 sales_collection = db["sales"]
@@ -10,80 +11,122 @@ expenses_collection = db["expenses"]
 class AIBusinessAnalyzer:
     """AI-powered business analysis and suggestion generator"""
     
+    # Each analysis is one $facet aggregation returning only counts, sums
+    # and top-N rows, so memory use does not grow with the ledger.
+    LOW_STOCK_THRESHOLD = 10
+    OVERSTOCK_THRESHOLD = 100
+
+    @staticmethod
+    def _first(rows, field, default=0):
+        return rows[0][field] if rows else default
+
     @staticmethod
     def analyze_sales_trends() -> Dict:
         """Analyze sales patterns and trends"""
         now = datetime.utcnow()
         week_ago = now - timedelta(days=7)
         month_ago = now - timedelta(days=30)
-        
-        # Weekly sales
-        weekly_sales = list(sales_collection.find({"created_at": {"$gte": week_ago}}))
-        weekly_revenue = sum(s.get("total_amount", 0) for s in weekly_sales)
-        
-        # Monthly sales
-        monthly_sales = list(sales_collection.find({"created_at": {"$gte": month_ago}}))
-        monthly_revenue = sum(s.get("total_amount", 0) for s in monthly_sales)
-        
+
+        def totals(since):
+            return [
+                {"$match": {"created_at": {"$gte": since}}},
+                {"$group": {
+                    "_id": None,
+                    "revenue": {"$sum": {"$ifNull": ["$total_amount", 0]}},
+                    "count": {"$sum": 1}
+                }}
+            ]
+
+        # weekly window is a subset of the monthly one: one scan for both
+        facets = list(sales_collection.aggregate([
+            {"$match": {"created_at": {"$gte": month_ago}}},
+            {"$facet": {
+                "weekly": totals(week_ago),
+                "monthly": totals(month_ago)
+            }}
+        ]))[0]
+
         # Product performance
-        product_sales = {}
-        for sale in monthly_sales:
-            for item in sale.get("items", []):
-                pid = item["product_id"]
-                product_sales[pid] = product_sales.get(pid, 0) + item["qty"]
-        
+        product_sales = sales_velocity.sold_qty(30)
+
+        first = AIBusinessAnalyzer._first
         return {
-            "weekly_revenue": weekly_revenue,
-            "monthly_revenue": monthly_revenue,
-            "total_sales_count": len(monthly_sales),
+            "weekly_revenue": first(facets["weekly"], "revenue"),
+            "monthly_revenue": first(facets["monthly"], "revenue"),
+            "total_sales_count": first(facets["monthly"], "count"),
             "top_products": sorted(product_sales.items(), key=lambda x: x[1], reverse=True)[:5]
         }
-    
+
     @staticmethod
     def analyze_inventory() -> Dict:
         """Analyze inventory levels and stock issues"""
-        low_stock_threshold = 10
-        
-        products = list(products_collection.find({"is_active": True}))
-        
-        low_stock = [p for p in products if p.get("stock_qty", 0) < low_stock_threshold]
-        out_of_stock = [p for p in products if p.get("stock_qty", 0) == 0]
-        overstocked = [p for p in products if p.get("stock_qty", 0) > 100]
-        
+        low = AIBusinessAnalyzer.LOW_STOCK_THRESHOLD
+        stock = {"$ifNull": ["$stock_qty", 0]}
+
+        def count_if(condition):
+            return {"$sum": {"$cond": [condition, 1, 0]}}
+
+        facets = list(products_collection.aggregate([
+            {"$match": {"is_active": True}},
+            {"$facet": {
+                "counts": [
+                    {"$group": {
+                        "_id": None,
+                        "total": {"$sum": 1},
+                        "low": count_if({"$lt": [stock, low]}),
+                        "out": count_if({"$eq": [stock, 0]}),
+                        "over": count_if({"$gt": [stock, AIBusinessAnalyzer.OVERSTOCK_THRESHOLD]})
+                    }}
+                ],
+                "low_items": [
+                    {"$match": {"$expr": {"$lt": [stock, low]}}},
+                    {"$sort": {"stock_qty": 1, "_id": 1}},
+                    {"$limit": 5},
+                    {"$project": {"_id": 0, "name": 1, "qty": stock}}
+                ]
+            }}
+        ]))[0]
+
+        first = AIBusinessAnalyzer._first
         return {
-            "total_products": len(products),
-            "low_stock_count": len(low_stock),
-            "out_of_stock_count": len(out_of_stock),
-            "overstocked_count": len(overstocked),
-            "low_stock_items": [{"name": p["name"], "qty": p.get("stock_qty", 0)} for p in low_stock[:5]]
+            "total_products": first(facets["counts"], "total"),
+            "low_stock_count": first(facets["counts"], "low"),
+            "out_of_stock_count": first(facets["counts"], "out"),
+            "overstocked_count": first(facets["counts"], "over"),
+            "low_stock_items": facets["low_items"]
         }
-    
+
     @staticmethod
     def analyze_expenses() -> Dict:
         """Analyze expense patterns"""
-        now = datetime.utcnow()
-        month_ago = now - timedelta(days=30)
-        
-        # Get monthly expenses
-        monthly_expenses = list(expenses_collection.find({
-            "is_active": True,
-            "created_at": {"$gte": month_ago}
-        }))
-        
-        total_expenses = sum(e.get("amount", 0) for e in monthly_expenses)
-        
-        # Category breakdown
-        category_expenses = {}
-        for expense in monthly_expenses:
-            cat = expense.get("category", "Other")
-            category_expenses[cat] = category_expenses.get(cat, 0) + expense.get("amount", 0)
-        
+        month_ago = datetime.utcnow() - timedelta(days=30)
+        amount = {"$ifNull": ["$amount", 0]}
+
+        facets = list(expenses_collection.aggregate([
+            {"$match": {"is_active": True, "created_at": {"$gte": month_ago}}},
+            {"$facet": {
+                "totals": [
+                    {"$group": {"_id": None, "total": {"$sum": amount}, "count": {"$sum": 1}}}
+                ],
+                # Category breakdown
+                "top_categories": [
+                    {"$group": {
+                        "_id": {"$ifNull": ["$category", "Other"]},
+                        "total": {"$sum": amount}
+                    }},
+                    {"$sort": {"total": -1, "_id": 1}},
+                    {"$limit": 3}
+                ]
+            }}
+        ]))[0]
+
+        first = AIBusinessAnalyzer._first
         return {
-            "monthly_expenses": total_expenses,
-            "expense_count": len(monthly_expenses),
-            "top_categories": sorted(category_expenses.items(), key=lambda x: x[1], reverse=True)[:3]
+            "monthly_expenses": first(facets["totals"], "total"),
+            "expense_count": first(facets["totals"], "count"),
+            "top_categories": [(row["_id"], row["total"]) for row in facets["top_categories"]]
         }
-    
+
     @staticmethod
     def generate_suggestions() -> List[Dict]:
         """Generate AI-powered business suggestions"""
@@ -96,9 +139,9 @@ class AIBusinessAnalyzer:
         
         # Try to use Gemini AI first
         try:
-            from utils.gemini_ai import GeminiAI
+            from utils.gemini_ai import get_client
             
-            gemini = GeminiAI()
+            gemini = get_client()
             if gemini.enabled:
                 business_data = {
                     "sales": sales_data,
@@ -208,5 +251,11 @@ class AIBusinessAnalyzer:
                     "overstocked_count": inventory_data["overstocked_count"]
                 }
             })
+
+        # Per-product suggestions from the vectorized rule engine
+        try:
+            suggestions.extend(rule_engine.sku_suggestions())
+        except Exception as e:
+            print(f"⚠️ Rule engine failed: {str(e)}")
         
         return suggestions
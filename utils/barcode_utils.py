@@ -1,12 +1,87 @@
 # utils/barcode_utils.py
-import random
+# Barcodes are drawn from an atomic counter document. Each worker leases a
+# block of sequence numbers with a single find_one_and_update and hands them
+# out locally, so allocation is O(1) and two workers never share a code.
+import threading
 
-def generate_barcode():
-    return "" + "".join(str(random.randint(0, 9)) for _ in range(4))
+from pymongo import ReturnDocument
 
-def generate_unique_barcode(collection):
-    while True:
-        barcode = generate_barcode()
-        if not collection.find_one({"barcode": barcode}):
-            return barcode
+from config import BARCODE_FORMAT, BARCODE_BLOCK_SIZE
+from database import db
 
+counters_collection = db["counters"]
+
+COUNTER_ID = "product_barcode"
+# Legacy barcodes are random 4-digit codes, so sequences start above them
+SEQUENCE_START = 10000
+# GS1 prefix reserved for in-store (restricted circulation) numbers
+EAN13_PREFIX = "2"
+
+
+def ean13_check_digit(digits: str) -> str:
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    return str((10 - total % 10) % 10)
+
+
+def format_barcode(seq: int, fmt: str = BARCODE_FORMAT) -> str:
+    if fmt == "ean13":
+        body = EAN13_PREFIX + str(seq).zfill(11)
+        return body + ean13_check_digit(body)
+    # Code128 carries its own checksum in the symbol, so the plain
+    # numeric payload is used as-is
+    return str(seq)
+
+
+class BarcodeAllocator:
+    def __init__(self, block_size: int = BARCODE_BLOCK_SIZE):
+        self.block_size = block_size
+        self._next = 0
+        self._end = -1          # last sequence number of the current block
+        self._seeded = False
+        self._lock = threading.Lock()
+
+    def _lease(self, size: int):
+        if not self._seeded:
+            counters_collection.update_one(
+                {"_id": COUNTER_ID},
+                {"$setOnInsert": {"seq": SEQUENCE_START - 1}},
+                upsert=True
+            )
+            self._seeded = True
+
+        counter = counters_collection.find_one_and_update(
+            {"_id": COUNTER_ID},
+            {"$inc": {"seq": size}},
+            return_document=ReturnDocument.AFTER
+        )
+        self._end = counter["seq"]
+        self._next = self._end - size + 1
+
+    def allocate(self, count: int = 1) -> list:
+        codes = []
+
+        with self._lock:
+            while len(codes) < count:
+                if self._next > self._end:
+                    # bulk imports lease everything they need at once
+                    self._lease(max(self.block_size, count - len(codes)))
+
+                take = min(count - len(codes), self._end - self._next + 1)
+                codes.extend(
+                    format_barcode(seq)
+                    for seq in range(self._next, self._next + take)
+                )
+                self._next += take
+
+        return codes
+
+
+_allocator = BarcodeAllocator()
+
+
+def allocate_barcodes(count: int) -> list:
+    return _allocator.allocate(count)
+
+
+def allocate_barcode() -> str:
+    return _allocator.allocate(1)[0]
@@ -0,0 +1,62 @@
+# utils/category_cache.py
+# Versioned in-memory category map shared by the product listing and the
+# barcode export, so resolving category names is one query per refresh
+# instead of one per product.
+import threading
+import time
+
+from database import db
+
+categories_collection = db["categories"]
+
+# Picks up category edits made through other workers
+REFRESH_SECONDS = 60
+
+_categories = None       # category_id -> {"name", "is_active"}
+_loaded_at = 0.0
+_version = 0
+_lock = threading.Lock()
+
+
+def _load():
+    return {
+        str(c["_id"]): {
+            "name": c["name"],
+            "is_active": c.get("is_active", True)
+        }
+        for c in categories_collection.find({}, {"name": 1, "is_active": 1})
+    }
+
+
+def get_categories():
+    """Returns the category_id -> {name, is_active} map, loading it if stale."""
+    global _categories, _loaded_at
+
+    with _lock:
+        if _categories is not None and time.monotonic() - _loaded_at < REFRESH_SECONDS:
+            return _categories
+        version = _version
+
+    categories = _load()
+
+    with _lock:
+        # don't publish a map that an invalidation raced past
+        if version == _version:
+            _categories = categories
+            _loaded_at = time.monotonic()
+
+    return categories
+
+
+def category_name(category_id, default=None):
+    category = get_categories().get(str(category_id))
+    return category["name"] if category else default
+
+
+def invalidate():
+    """Called by the category routes after any write."""
+    global _categories, _version
+
+    with _lock:
+        _version += 1
+        _categories = None
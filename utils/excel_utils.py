@@ -1,21 +1,26 @@
-import pandas as pd
-import os
+# utils/excel_utils.py
+# Barcode sheet export. The workbook is built from Mongo into an in-memory
+# buffer per download with a streaming (write-only) writer, so there is no
+# shared file on disk to keep in sync across workers.
+import io
 
-FILE_PATH = "product_barcodes.xlsx"
+from openpyxl import Workbook
 
-def append_product_to_excel(product: dict):
-    columns = ["Product Name", "Category", "Barcode", "Selling Price"]
+COLUMNS = ["Product Name", "Category", "Barcode", "Selling Price"]
 
-    if os.path.exists(FILE_PATH):
-        df = pd.read_excel(FILE_PATH)
-    else:
-        df = pd.DataFrame(columns=columns)
 
-    df.loc[len(df)] = [
-        product["name"],
-        product["category"],
-        product["barcode"],
-        product["selling_price"]
-    ]
+def write_workbook(rows, target):
+    """Stream header + rows into a write-only workbook saved to `target`."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(COLUMNS)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(target)
 
-    df.to_excel(FILE_PATH, index=False)
+
+def build_workbook_buffer(rows) -> io.BytesIO:
+    buffer = io.BytesIO()
+    write_workbook(rows, buffer)
+    buffer.seek(0)
+    return buffer
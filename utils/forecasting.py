@@ -0,0 +1,124 @@
+# utils/forecasting.py
+# Vectorized demand forecasting for the whole catalog at once.
+#
+# Sales history comes from the shared velocity service as a products x days
+# NumPy matrix (one rollup aggregation, cached). Every SKU is then fitted
+# together with Holt's linear exponential smoothing on day-of-week
+# deseasonalized demand, so the cost is one pass over the days with
+# array operations across all products.
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+from utils import sales_velocity
+
+ALPHA = 0.1             # level smoothing
+BETA = 0.02             # trend smoothing
+PHI = 0.9               # trend damping, keeps short bursts from compounding
+SEASON_LENGTH = 7       # day-of-week seasonality
+FULL_SEASON_DAYS = 28   # history needed before weekday effects are fully trusted
+Z_95 = 1.96
+
+
+def _seasonal_indices(matrix: np.ndarray, weekdays: np.ndarray) -> np.ndarray:
+    """Multiplicative day-of-week index per product, shape (products, 7)."""
+    products, days = matrix.shape
+    mean = matrix.mean(axis=1, keepdims=True)
+
+    sums = np.zeros((products, SEASON_LENGTH))
+    counts = np.zeros(SEASON_LENGTH)
+    for w in range(SEASON_LENGTH):
+        mask = weekdays == w
+        sums[:, w] = matrix[:, mask].sum(axis=1)
+        counts[w] = mask.sum()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        seasonal = (sums / np.maximum(counts, 1)) / mean
+    seasonal[:, counts == 0] = 1.0
+    seasonal = np.nan_to_num(seasonal, nan=1.0, posinf=1.0)
+
+    # shrink towards 1 while history is short, then renormalize to mean 1
+    shrink = min(1.0, days / FULL_SEASON_DAYS)
+    seasonal = 1.0 + (seasonal - 1.0) * shrink
+    seasonal = np.maximum(seasonal, 0.05)
+    return seasonal / seasonal.mean(axis=1, keepdims=True)
+
+
+def fit_forecast(matrix: np.ndarray, first_day: datetime, horizon: int) -> Dict[str, np.ndarray]:
+    """
+    Fit Holt + weekday seasonality to every row of `matrix` and forecast
+    the next `horizon` days. Returns per-product arrays.
+    """
+    products, days = matrix.shape
+    weekdays = (first_day.weekday() + np.arange(days)) % SEASON_LENGTH
+    seasonal = _seasonal_indices(matrix, weekdays)
+
+    rows = np.arange(products)
+    deseasonalized = matrix / seasonal[:, weekdays]
+
+    level = deseasonalized[:, :SEASON_LENGTH].mean(axis=1)
+    trend = np.zeros(products)
+    squared_error = np.zeros(products)
+
+    for t in range(days):
+        predicted = level + PHI * trend
+        squared_error += (deseasonalized[:, t] - predicted) ** 2
+        previous_level = level
+        level = ALPHA * deseasonalized[:, t] + (1 - ALPHA) * predicted
+        trend = BETA * (level - previous_level) + (1 - BETA) * PHI * trend
+
+    steps = np.arange(1, horizon + 1)
+    damped_steps = np.cumsum(PHI ** steps)
+    future_weekdays = (first_day.weekday() + days + steps - 1) % SEASON_LENGTH
+    daily = np.maximum(level[:, None] + trend[:, None] * damped_steps, 0) * seasonal[rows[:, None], future_weekdays]
+    forecast = daily.sum(axis=1)
+
+    # horizon total = h independent daily errors plus h times the
+    # error in the smoothed level (variance ~ sigma^2 * alpha / (2 - alpha))
+    sigma = np.sqrt(squared_error / max(days, 1))
+    spread = Z_95 * sigma * np.sqrt(horizon + horizon ** 2 * ALPHA / (2 - ALPHA))
+
+    return {
+        "avg_daily": matrix.mean(axis=1) if days else np.zeros(products),
+        "forecast": forecast,
+        "lower": np.maximum(forecast - spread, 0),
+        "upper": forecast + spread
+    }
+
+
+def forecast_demand(past_days: int, horizon: int, stock: Optional[Dict[str, float]] = None) -> Dict[str, Dict]:
+    """
+    Forecast demand for the next `horizon` days for every product sold in
+    the last `past_days` days. With `stock` (product_id -> qty), also
+    returns days_of_cover at the forecast rate (None if no demand).
+    """
+    product_ids, first_day, history = sales_velocity.daily_history(past_days)
+    if not product_ids:
+        return {}
+
+    # fit on complete days only; today's partial column would drag the level down
+    matrix = history[:, :-1]
+
+    fitted = fit_forecast(matrix, first_day, horizon)
+
+    days_of_cover = None
+    if stock is not None:
+        on_hand = np.array([stock.get(pid, 0) for pid in product_ids], dtype=float)
+        rate = fitted["forecast"] / horizon
+        with np.errstate(divide="ignore", invalid="ignore"):
+            days_of_cover = np.where(rate > 0, on_hand / rate, np.nan)
+
+    result = {}
+    for i, pid in enumerate(product_ids):
+        result[pid] = {
+            "avg_daily": float(fitted["avg_daily"][i]),
+            "forecast": float(fitted["forecast"][i]),
+            "lower": float(fitted["lower"][i]),
+            "upper": float(fitted["upper"][i]),
+            "days_of_cover": (
+                None if days_of_cover is None or np.isnan(days_of_cover[i])
+                else float(days_of_cover[i])
+            )
+        }
+    return result
@@ -1,22 +1,139 @@
 import os
+import random
+import threading
+import time
 from typing import Dict, List
 import google.generativeai as genai
 from dotenv import load_dotenv
+from utils import ai_response_cache
 
 load_dotenv()
 
+# Per-attempt deadline, retries after the first attempt, and the circuit
+# breaker: after BREAKER_THRESHOLD consecutive failed calls Gemini is
+# skipped for BREAKER_COOLDOWN_SECONDS, then one trial call is let through.
+TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "20"))
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+RETRY_BACKOFF_SECONDS = float(os.getenv("GEMINI_RETRY_BACKOFF_SECONDS", "1"))
+BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "3"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("GEMINI_BREAKER_COOLDOWN_SECONDS", "300"))
+
+
+class CircuitOpen(Exception):
+    pass
+
+
 class GeminiAI:
     """Wrapper for Google Gemini AI model"""
+
+    MODEL_NAME = 'gemini-pro'
     
-    def __init__(self):
+    def __init__(self, model=None):
+        """
+        Args:
+            model: object with generate_content(prompt, **kwargs); replaces
+                the real Gemini model (e.g. a local fake in tests)
+        """
         api_key = os.getenv("GEMINI_API_KEY")
-        if api_key and api_key != "your_gemini_api_key_here":
+        if model is not None:
+            self.model = model
+            self.enabled = True
+        elif api_key and api_key != "your_gemini_api_key_here":
             genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
+            self.model = genai.GenerativeModel(self.MODEL_NAME)
             self.enabled = True
         else:
             self.enabled = False
             print("⚠️ Gemini API key not configured. Using rule-based suggestions.")
+
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self._trial_in_flight = False
+        self._stats = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "short_circuits": 0,
+            "last_latency_ms": None,
+            "max_latency_ms": None
+        }
+
+    # -------------------------------------------------
+    # CIRCUIT BREAKER
+    # -------------------------------------------------
+    def _acquire(self):
+        with self._lock:
+            if self._consecutive_failures >= BREAKER_THRESHOLD:
+                if time.monotonic() < self._open_until or self._trial_in_flight:
+                    self._stats["short_circuits"] += 1
+                    raise CircuitOpen()
+                # half-open: this call is the trial
+                self._trial_in_flight = True
+            self._stats["calls"] += 1
+
+    def _record(self, ok, started):
+        latency_ms = round((time.monotonic() - started) * 1000, 1)
+        with self._lock:
+            self._trial_in_flight = False
+            self._stats["last_latency_ms"] = latency_ms
+            self._stats["max_latency_ms"] = max(self._stats["max_latency_ms"] or 0, latency_ms)
+            if ok:
+                self._stats["successes"] += 1
+                self._consecutive_failures = 0
+            else:
+                self._stats["failures"] += 1
+                self._consecutive_failures += 1
+                if self._consecutive_failures >= BREAKER_THRESHOLD:
+                    self._open_until = time.monotonic() + BREAKER_COOLDOWN_SECONDS
+
+    def _generate_text(self, prompt):
+        """One logical call: bounded attempts, each with its own deadline."""
+        self._acquire()
+        started = time.monotonic()
+
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = self.model.generate_content(
+                    prompt,
+                    request_options={"timeout": TIMEOUT_SECONDS}
+                )
+                text = response.text
+                self._record(True, started)
+                return text
+            except Exception as e:
+                if attempt == MAX_RETRIES:
+                    self._record(False, started)
+                    raise
+                print(f"⚠️ Gemini attempt {attempt + 1} failed, retrying: {str(e)}")
+                with self._lock:
+                    self._stats["retries"] += 1
+                # exponential backoff with full jitter
+                time.sleep(random.uniform(0, RETRY_BACKOFF_SECONDS * 2 ** attempt))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            breaker_open = (
+                self._consecutive_failures >= BREAKER_THRESHOLD
+                and time.monotonic() < self._open_until
+            )
+            return {
+                **self._stats,
+                "enabled": self.enabled,
+                "breaker": "open" if breaker_open else (
+                    "half_open" if self._consecutive_failures >= BREAKER_THRESHOLD else "closed"
+                ),
+                "consecutive_failures": self._consecutive_failures,
+                "timeout_seconds": TIMEOUT_SECONDS,
+                "max_retries": MAX_RETRIES,
+                # upper bound on time spent in one generate call
+                "worst_case_seconds": round(
+                    (MAX_RETRIES + 1) * TIMEOUT_SECONDS
+                    + sum(RETRY_BACKOFF_SECONDS * 2 ** i for i in range(MAX_RETRIES)),
+                    1
+                )
+            }
     
     def generate_business_suggestions(self, business_data: Dict) -> List[Dict]:
         """
@@ -30,6 +147,12 @@ class GeminiAI:
         """
         if not self.enabled:
             return []
+
+        # identical (rounded) metrics get the same answer without a new call
+        cache_key = ai_response_cache.cache_key(business_data, self.MODEL_NAME)
+        cached = ai_response_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         try:
             # Create a detailed prompt for Gemini
@@ -79,23 +202,58 @@ Example:
 """
             
             # Generate content using Gemini
-            response = self.model.generate_content(prompt)
+            text = self._generate_text(prompt)
             
             # Parse the response
             import json
             import re
             
             # Extract JSON from response
-            text = response.text
             # Try to find JSON array in the response
             json_match = re.search(r'\[[\s\S]*\]', text)
             if json_match:
                 suggestions = json.loads(json_match.group())
+                if suggestions:
+                    ai_response_cache.put(cache_key, self.MODEL_NAME, suggestions)
                 return suggestions
             else:
                 print("⚠️ Could not parse AI response as JSON")
                 return []
                 
+        except CircuitOpen:
+            return []
         except Exception as e:
             print(f"⚠️ Gemini AI error: {str(e)}")
             return []
+
+
+# -------------------------------------------------
+# PROCESS-WIDE CLIENT
+# genai.configure and the model are set up once and the breaker state is
+# shared by every request in the process.
+# -------------------------------------------------
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> GeminiAI:
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            _client = GeminiAI()
+        return _client
+
+
+def set_client(client: GeminiAI):
+    """Swap the process-wide client (e.g. GeminiAI(model=FakeModel()))."""
+    global _client
+
+    with _client_lock:
+        _client = client
+
+
+def client_stats() -> Dict:
+    with _client_lock:
+        client = _client
+    return client.stats() if client else {"initialized": False}
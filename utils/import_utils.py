@@ -0,0 +1,66 @@
+# utils/import_utils.py
+# Streams rows out of an uploaded .xlsx or .csv file without loading the
+# whole sheet into memory.
+import csv
+import io
+
+from fastapi import HTTPException
+from openpyxl import load_workbook
+
+
+def normalize_header(value):
+    return str(value or "").strip().lower().replace(" ", "_")
+
+
+def _clean(value):
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def _rows_from_xlsx(fileobj):
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [normalize_header(h) for h in next(rows, [])]
+        for values in rows:
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def _rows_from_csv(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    reader = csv.reader(text)
+    header = [normalize_header(h) for h in next(reader, [])]
+    for values in reader:
+        yield dict(zip(header, values))
+
+
+def iter_upload_rows(upload, aliases=None):
+    """
+    Yields (row_number, row) for every non-blank data row of an uploaded
+    spreadsheet. Headers are lower-cased with spaces replaced by
+    underscores, then renamed through `aliases`. Row numbers match the
+    sheet (the header is row 1).
+    """
+    filename = (upload.filename or "").lower()
+
+    if filename.endswith(".xlsx"):
+        rows = _rows_from_xlsx(upload.file)
+    elif filename.endswith(".csv"):
+        rows = _rows_from_csv(upload.file)
+    else:
+        raise HTTPException(status_code=400, detail="Upload an .xlsx or .csv file")
+
+    aliases = aliases or {}
+
+    for row_number, row in enumerate(rows, start=2):
+        row = {
+            aliases.get(key, key): _clean(value)
+            for key, value in row.items()
+            if key
+        }
+        if any(value is not None for value in row.values()):
+            yield row_number, row
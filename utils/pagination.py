@@ -0,0 +1,55 @@
+# utils/pagination.py
+# Keyset (cursor) pagination over (created_at, _id), newest first.
+import base64
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(doc):
+    raw = f"{doc['created_at'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, oid = raw.split("|")
+        return datetime.fromisoformat(created_at), ObjectId(oid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_filter(cursor):
+    """Match documents strictly after the cursor in (created_at, _id) desc order."""
+    created_at, oid = decode_cursor(cursor)
+    return {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": oid}}
+        ]
+    }
+
+
+def fetch_page(collection, query, limit, projection=None):
+    """
+    Returns (docs, next_cursor). One extra document is read to know
+    whether another page exists.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    docs = list(
+        collection.find(query, projection)
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+    )
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1])
+
+    return docs, next_cursor
@@ -0,0 +1,186 @@
+# utils/product_cache.py
+# Process-local barcode -> product index used by barcode scans and checkout.
+# Entries are bounded (LRU + TTL) and invalidated by the product routes and,
+# when the deployment supports it, by a MongoDB change stream on products.
+import threading
+import time
+from collections import OrderedDict
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from database import db
+
+products_collection = db["products"]
+
+MAX_ENTRIES = 5000
+# Upper bound on staleness for writes made by other workers when
+# change streams are not available (standalone / local MongoDB)
+ENTRY_TTL_SECONDS = 300
+
+PROJECTION = {
+    "name": 1,
+    "barcode": 1,
+    "selling_price": 1,
+    "stock_qty": 1
+}
+
+_entries = OrderedDict()     # barcode -> (expires_at, entry)
+_barcode_by_id = {}          # product_id -> barcode
+_generation = 0              # bumped on every invalidation
+_lock = threading.Lock()
+
+
+def _to_entry(product):
+    return {
+        "id": str(product["_id"]),
+        "name": product["name"],
+        "barcode": product["barcode"],
+        "selling_price": product["selling_price"],
+        "stock_qty": product.get("stock_qty", 0)    # hint only
+    }
+
+
+def _drop(barcode):
+    cached = _entries.pop(barcode, None)
+    if cached:
+        _barcode_by_id.pop(cached[1]["id"], None)
+
+
+# -------------------------------------------------
+# LOOKUP
+# -------------------------------------------------
+def get_many(barcodes):
+    """
+    Resolve barcodes to cached product entries.
+    Misses are loaded with a single $in query. Unknown or inactive
+    barcodes are simply absent from the returned dict.
+    """
+    now = time.monotonic()
+    found = {}
+    missing = []
+
+    with _lock:
+        for barcode in dict.fromkeys(barcodes):
+            cached = _entries.get(barcode)
+            if cached and cached[0] > now:
+                _entries.move_to_end(barcode)
+                found[barcode] = dict(cached[1])
+            else:
+                missing.append(barcode)
+        generation = _generation
+
+    if not missing:
+        return found
+
+    loaded = [
+        _to_entry(p)
+        for p in products_collection.find(
+            {"barcode": {"$in": missing}, "is_active": True},
+            PROJECTION
+        )
+    ]
+
+    with _lock:
+        # skip caching if something was invalidated while we were reading
+        cacheable = generation == _generation
+        expires_at = time.monotonic() + ENTRY_TTL_SECONDS
+
+        for entry in loaded:
+            found[entry["barcode"]] = dict(entry)
+            if not cacheable:
+                continue
+            _drop(entry["barcode"])
+            _entries[entry["barcode"]] = (expires_at, entry)
+            _barcode_by_id[entry["id"]] = entry["barcode"]
+
+        while len(_entries) > MAX_ENTRIES:
+            barcode, (_, entry) = _entries.popitem(last=False)
+            _barcode_by_id.pop(entry["id"], None)
+
+    return found
+
+
+def get(barcode):
+    return get_many([barcode]).get(barcode)
+
+
+# -------------------------------------------------
+# INVALIDATION
+# -------------------------------------------------
+def invalidate(barcode=None, product_id=None):
+    global _generation
+
+    with _lock:
+        _generation += 1
+        if product_id is not None:
+            barcode = _barcode_by_id.get(str(product_id), barcode)
+        if barcode is not None:
+            _drop(barcode)
+
+
+def invalidate_all():
+    global _generation
+
+    with _lock:
+        _generation += 1
+        _entries.clear()
+        _barcode_by_id.clear()
+
+
+def adjust_stock(barcode, delta):
+    # keeps the stock hint roughly current after a local sale
+    with _lock:
+        cached = _entries.get(barcode)
+        if cached:
+            cached[1]["stock_qty"] += delta
+
+
+# -------------------------------------------------
+# CHANGE STREAM WATCHER
+# -------------------------------------------------
+# Only changes to cached fields evict. Checkout updates stock_qty and
+# inventory_value on every sale; evicting on those would send the next scan
+# of a hot SKU back to Mongo (stock_qty is kept current by adjust_stock).
+CACHED_FIELDS = ["name", "barcode", "selling_price", "is_active"]
+
+WATCH_PIPELINE = [
+    {"$match": {"$or": [
+        {"operationType": {"$nin": ["insert", "update"]}},
+        {
+            "operationType": "update",
+            "$or": [
+                {f"updateDescription.updatedFields.{field}": {"$exists": True}}
+                for field in CACHED_FIELDS
+            ] + [{"updateDescription.removedFields": {"$in": CACHED_FIELDS}}]
+        }
+    ]}},
+    {"$project": {"operationType": 1, "documentKey": 1}}
+]
+
+
+def _watch_products():
+    while True:
+        try:
+            with products_collection.watch(WATCH_PIPELINE) as stream:
+                for change in stream:
+                    key = change.get("documentKey")
+                    if key:
+                        invalidate(product_id=key["_id"])
+                    else:
+                        invalidate_all()
+        except OperationFailure as e:
+            # standalone servers do not support change streams
+            print(f"⚠️ Product change stream unavailable, using cache TTL only: {e}")
+            return
+        except PyMongoError as e:
+            print(f"⚠️ Product change stream interrupted: {e}")
+            invalidate_all()
+            time.sleep(5)
+
+
+def start_change_stream_watcher():
+    threading.Thread(
+        target=_watch_products,
+        name="product-cache-watcher",
+        daemon=True
+    ).start()
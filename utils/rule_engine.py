@@ -0,0 +1,224 @@
+# utils/rule_engine.py
+# Per-SKU rule-based suggestions, evaluated over the whole catalog at once.
+#
+# One frame holds every active product with its derived signals (velocity,
+# days of cover, margin, stock age, overstock). It is built from three
+# reads: the products, the cached sales velocity and one aggregation for
+# the last purchase date. Rules are declarative entries in RULES: a
+# vectorized condition and score over that frame plus message templates,
+# so adding a rule never adds a query or a Python loop over products.
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from database import db
+from utils import sales_velocity
+
+products_collection = db["products"]
+purchases_collection = db["purchases"]
+
+VELOCITY_DAYS = 30          # window for average daily sales
+LOW_COVER_DAYS = 7          # restock when stock lasts less than this
+OVERSTOCK_DAYS = 90         # stock beyond this many days of sales is excess
+DEAD_STOCK_AGE_DAYS = 60    # unsold and not restocked for this long
+THIN_MARGIN = 0.10
+MAX_SUGGESTIONS = 20
+
+PRIORITY_RANK = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+
+# Columns: stock_qty, velocity (units/day), days_of_cover, selling_price,
+# unit_cost, margin (fraction of selling price), stock_age_days (since the
+# last purchase, NaN if never purchased), excess_qty.
+# score ranks hits within the same priority, in rupees where possible.
+RULES = [
+    {
+        "id": "out_of_stock_selling",
+        "type": "inventory",
+        "priority": "critical",
+        "when": lambda f: (f.stock_qty <= 0) & (f.velocity > 0),
+        "score": lambda f: f.velocity * f.selling_price,
+        "title": "🚨 {name} is out of stock",
+        "description": "{name} sells about {velocity:.1f} units a day and has no stock. "
+                       "Reorder now to stop losing about ₹{score:.0f} of sales per day."
+    },
+    {
+        "id": "low_cover",
+        "type": "inventory",
+        "priority": "high",
+        "when": lambda f: (f.stock_qty > 0) & (f.days_of_cover < LOW_COVER_DAYS),
+        "score": lambda f: f.velocity * f.selling_price,
+        "title": "⚠️ Restock {name}",
+        "description": "{stock_qty:.0f} units left, about {days_of_cover:.1f} days of sales. "
+                       "Reorder at least {reorder_qty:.0f} units to cover the next "
+                       f"{LOW_COVER_DAYS} days."
+    },
+    {
+        "id": "negative_margin",
+        "type": "sales",
+        "priority": "high",
+        "when": lambda f: f.margin < 0,
+        "score": lambda f: (f.unit_cost - f.selling_price) * np.maximum(f.velocity * VELOCITY_DAYS, 1),
+        "title": "💸 {name} sells below cost",
+        "description": "Selling price ₹{selling_price:.2f} is under the average cost "
+                       "₹{unit_cost:.2f}. Review the price or the supplier."
+    },
+    {
+        "id": "thin_margin",
+        "type": "sales",
+        "priority": "medium",
+        "when": lambda f: (f.margin >= 0) & (f.margin < THIN_MARGIN) & (f.velocity > 0),
+        "score": lambda f: (THIN_MARGIN - f.margin) * f.selling_price * f.velocity * VELOCITY_DAYS,
+        "title": "📉 Thin margin on {name}",
+        "description": "{name} earns a {margin_pct:.1f}% margin while selling "
+                       "{velocity:.1f} units a day. A small price increase would add up."
+    },
+    {
+        "id": "dead_stock",
+        "type": "inventory",
+        "priority": "medium",
+        "when": lambda f: (f.velocity == 0) & (f.stock_qty > 0)
+                          & (f.stock_age_days >= DEAD_STOCK_AGE_DAYS),
+        "score": lambda f: f.stock_qty * f.unit_cost,
+        "title": "🧊 {name} is not moving",
+        "description": f"No sales in {VELOCITY_DAYS} days and last restocked "
+                       "{stock_age_days:.0f} days ago. Clear the {stock_qty:.0f} units "
+                       "(₹{score:.0f} tied up) with a discount or bundle."
+    },
+    {
+        "id": "overstock",
+        "type": "inventory",
+        "priority": "low",
+        "when": lambda f: (f.velocity > 0) & (f.excess_qty > 0),
+        "score": lambda f: f.excess_qty * f.unit_cost,
+        "title": "📦 Too much {name} on hand",
+        "description": "{days_of_cover:.0f} days of stock at the current rate. Pause "
+                       "purchases; about ₹{score:.0f} is held in excess stock."
+    },
+]
+
+
+# -------------------------------------------------
+# FRAME
+# -------------------------------------------------
+def _last_purchase_dates() -> Dict[str, datetime]:
+    return {
+        row["_id"]: row["last_purchase"]
+        for row in purchases_collection.aggregate([
+            {"$match": {"is_active": True}},
+            {"$project": {"created_at": 1, "items.product_id": 1}},
+            {"$unwind": "$items"},
+            {"$group": {"_id": "$items.product_id", "last_purchase": {"$max": "$created_at"}}}
+        ])
+    }
+
+
+def build_frame(products: List[dict], velocity: Dict[str, float],
+                last_purchase: Dict[str, datetime], now: datetime) -> pd.DataFrame:
+    frame = pd.DataFrame({
+        "product_id": [str(p["_id"]) for p in products],
+        "name": [p.get("name", "") for p in products],
+        "stock_qty": [p.get("stock_qty", 0) for p in products],
+        "selling_price": [p.get("selling_price", 0) for p in products],
+        "unit_cost": [p.get("avg_cost", p.get("purchase_price", 0)) for p in products],
+    })
+    frame[["stock_qty", "selling_price", "unit_cost"]] = (
+        frame[["stock_qty", "selling_price", "unit_cost"]].astype(float).fillna(0)
+    )
+
+    frame["velocity"] = frame.product_id.map(velocity).fillna(0.0).astype(float)
+    last = pd.to_datetime(frame.product_id.map(last_purchase))
+    frame["stock_age_days"] = (pd.Timestamp(now) - last).dt.total_seconds() / 86400
+
+    stock = frame.stock_qty.to_numpy()
+    rate = frame.velocity.to_numpy()
+    price = frame.selling_price.to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frame["days_of_cover"] = np.where(rate > 0, np.maximum(stock, 0) / rate, np.inf)
+        frame["margin"] = np.where(price > 0, (price - frame.unit_cost.to_numpy()) / price, np.nan)
+    frame["excess_qty"] = np.maximum(stock - rate * OVERSTOCK_DAYS, 0)
+
+    return frame
+
+
+def load_frame(now: datetime = None) -> pd.DataFrame:
+    now = now or datetime.utcnow()
+    products = list(products_collection.find(
+        {"is_active": True},
+        {"name": 1, "stock_qty": 1, "selling_price": 1, "avg_cost": 1, "purchase_price": 1}
+    ))
+    return build_frame(
+        products,
+        sales_velocity.avg_daily(VELOCITY_DAYS),
+        _last_purchase_dates(),
+        now
+    )
+
+
+# -------------------------------------------------
+# EVALUATION
+# -------------------------------------------------
+def _number(value, digits=2):
+    value = float(value)
+    return round(value, digits) if np.isfinite(value) else None
+
+
+def evaluate(frame: pd.DataFrame, limit: int = MAX_SUGGESTIONS) -> List[Dict]:
+    """Apply every rule to the frame and return the top `limit` hits."""
+    rows, rules, ranks, scores = [], [], [], []
+    for index, rule in enumerate(RULES):
+        mask = rule["when"](frame).fillna(False).to_numpy(dtype=bool)
+        matched = np.flatnonzero(mask)
+        if not matched.size:
+            continue
+        score = np.asarray(rule["score"](frame), dtype=float)[matched]
+        rows.append(matched)
+        rules.append(np.full(matched.size, index))
+        ranks.append(np.full(matched.size, PRIORITY_RANK[rule["priority"]]))
+        scores.append(np.nan_to_num(score))
+
+    if not rows:
+        return []
+
+    rows, rules = np.concatenate(rows), np.concatenate(rules)
+    ranks, scores = np.concatenate(ranks), np.concatenate(scores)
+
+    # priority first, then highest score
+    order = np.lexsort((-scores, ranks))[:limit]
+    top = zip(rows[order], rules[order], scores[order])
+
+    # only the selected hits are formatted
+    suggestions = []
+    for row, rule_index, score in top:
+        rule = RULES[rule_index]
+        product = frame.iloc[row]
+        values = {
+            **product.to_dict(),
+            "score": score,
+            "margin_pct": (product.margin or 0) * 100,
+            "reorder_qty": max(product.velocity * LOW_COVER_DAYS - product.stock_qty, 0),
+        }
+        suggestions.append({
+            "type": rule["type"],
+            "title": rule["title"].format(**values),
+            "description": rule["description"].format(**values),
+            "priority": rule["priority"],
+            "data_insights": {
+                "rule": rule["id"],
+                "product_id": product.product_id,
+                "name": product["name"],
+                "stock_qty": _number(product.stock_qty),
+                "avg_daily_sales": _number(product.velocity),
+                "days_of_cover": _number(product.days_of_cover, 1),
+                "margin": _number(product.margin, 3),
+                "stock_age_days": _number(product.stock_age_days, 0),
+                "score": _number(score)
+            }
+        })
+
+    return suggestions
+
+
+def sku_suggestions(limit: int = MAX_SUGGESTIONS) -> List[Dict]:
+    return evaluate(load_frame(), limit)
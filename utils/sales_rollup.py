@@ -0,0 +1,214 @@
+# utils/sales_rollup.py
+# Pre-aggregated daily sales per product: one sales_daily document per
+# (day, product_id) holding qty, revenue, cost and bill count. Maintained with
+# $inc upserts in the same transaction as add_sale, so analytics read
+# days x products documents instead of every sale line ever written.
+#
+# Sales written through the rollup carry rolled_up: True. Older sales are
+# folded in once by start_initial_backfill() at app startup (guarded by a
+# migrations document so only one worker ever runs it). A full rebuild can
+# still be run by hand, in a quiet period:
+#     python -m utils.sales_rollup backfill
+import sys
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+
+sales_collection = db["sales"]
+sales_daily_collection = db["sales_daily"]
+migrations_collection = db["migrations"]
+
+BACKFILL_MIGRATION_ID = "sales_daily_backfill"
+NOT_ROLLED_UP = {"rolled_up": {"$ne": True}}
+
+
+def day_start(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, ts.day)
+
+
+def rollup_ops(sale: dict):
+    day = day_start(sale["created_at"])
+    totals = defaultdict(lambda: {"qty": 0, "revenue": 0, "cost": 0})
+
+    for item in sale["items"]:
+        totals[item["product_id"]]["qty"] += item["qty"]
+        totals[item["product_id"]]["revenue"] += item["qty"] * item["price"]
+        totals[item["product_id"]]["cost"] += item["qty"] * item.get("unit_cost", 0)
+
+    return [
+        UpdateOne(
+            {"day": day, "product_id": product_id},
+            {"$inc": {
+                "qty": t["qty"],
+                "revenue": t["revenue"],
+                "cost": t["cost"],
+                "bills": 1
+            }},
+            upsert=True
+        )
+        for product_id, t in totals.items()
+    ]
+
+
+def apply_sale(sale: dict, session=None):
+    ops = rollup_ops(sale)
+    if ops:
+        sales_daily_collection.bulk_write(ops, ordered=False, session=session)
+
+
+def _rollup_pipeline(match, when_matched):
+    """
+    Aggregate the matching sales into sales_daily rows, server-side.
+    Lines sold before unit_cost was stamped are costed at the product's
+    current purchase price, the best figure available for them.
+    """
+    return [
+        {"$match": match},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {
+                "day": {"$dateFromParts": {
+                    "year": {"$year": "$created_at"},
+                    "month": {"$month": "$created_at"},
+                    "day": {"$dayOfMonth": "$created_at"}
+                }},
+                "product_id": "$items.product_id",
+                "sale_id": "$_id"
+            },
+            "qty": {"$sum": "$items.qty"},
+            "revenue": {"$sum": {"$multiply": ["$items.qty", "$items.price"]}},
+            "stamped_cost": {"$sum": {"$multiply": [
+                "$items.qty", {"$ifNull": ["$items.unit_cost", 0]}
+            ]}},
+            "unstamped_qty": {"$sum": {"$cond": [
+                {"$eq": [{"$type": "$items.unit_cost"}, "missing"]},
+                "$items.qty",
+                0
+            ]}}
+        }},
+        {"$group": {
+            "_id": {"day": "$_id.day", "product_id": "$_id.product_id"},
+            "qty": {"$sum": "$qty"},
+            "revenue": {"$sum": "$revenue"},
+            "stamped_cost": {"$sum": "$stamped_cost"},
+            "unstamped_qty": {"$sum": "$unstamped_qty"},
+            "bills": {"$sum": 1}
+        }},
+        {"$lookup": {
+            "from": "products",
+            "let": {"pid": {"$convert": {
+                "input": "$_id.product_id", "to": "objectId", "onError": None
+            }}},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$pid"]}}},
+                {"$project": {"purchase_price": 1}}
+            ],
+            "as": "product"
+        }},
+        {"$project": {
+            "_id": 0,
+            "day": "$_id.day",
+            "product_id": "$_id.product_id",
+            "qty": 1,
+            "revenue": 1,
+            "cost": {"$add": [
+                "$stamped_cost",
+                {"$multiply": [
+                    "$unstamped_qty",
+                    {"$ifNull": [{"$first": "$product.purchase_price"}, 0]}
+                ]}
+            ]},
+            "bills": 1
+        }},
+        {"$merge": {
+            "into": "sales_daily",
+            "on": ["day", "product_id"],
+            "whenMatched": when_matched,
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+
+# adds the incoming totals to a row the live path has already started
+_ADD_TO_EXISTING = [
+    {"$set": {
+        field: {"$add": [{"$ifNull": [f"${field}", 0]}, f"$$new.{field}"]}
+        for field in ("qty", "revenue", "cost", "bills")
+    }}
+]
+
+
+def backfill():
+    """Rebuild sales_daily from every sale, replacing existing rows."""
+    sales_collection.aggregate(_rollup_pipeline({}, "replace"), allowDiskUse=True)
+    sales_collection.update_many(NOT_ROLLED_UP, {"$set": {"rolled_up": True}})
+
+
+def backfill_unrolled():
+    """
+    Fold sales written before the rollup existed into sales_daily. Sales
+    from add_sale are flagged rolled_up, so only history is counted and
+    live rows are added to rather than replaced.
+    """
+    sales_collection.aggregate(
+        _rollup_pipeline(NOT_ROLLED_UP, _ADD_TO_EXISTING),
+        allowDiskUse=True
+    )
+    sales_collection.update_many(NOT_ROLLED_UP, {"$set": {"rolled_up": True}})
+
+
+def _run_initial_backfill():
+    try:
+        migrations_collection.insert_one({
+            "_id": BACKFILL_MIGRATION_ID,
+            "status": "running",
+            "started_at": datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        return      # done, or being run by another worker
+
+    try:
+        backfill_unrolled()
+    except Exception as e:
+        migrations_collection.update_one(
+            {"_id": BACKFILL_MIGRATION_ID},
+            {"$set": {"status": "failed", "error": str(e)}}
+        )
+        print(f"❌ sales_daily backfill failed, rebuild with `python -m utils.sales_rollup backfill`: {e}")
+        return
+
+    migrations_collection.update_one(
+        {"_id": BACKFILL_MIGRATION_ID},
+        {"$set": {"status": "done", "finished_at": datetime.utcnow()}}
+    )
+    print("✅ sales_daily backfilled from existing sales")
+
+
+def start_initial_backfill():
+    """Called from the app startup event; returns immediately."""
+    threading.Thread(
+        target=_run_initial_backfill,
+        name="sales-rollup-backfill",
+        daemon=True
+    ).start()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["backfill"]:
+        from database import ensure_indexes
+
+        ensure_indexes()
+        backfill()
+        migrations_collection.update_one(
+            {"_id": BACKFILL_MIGRATION_ID},
+            {"$set": {"status": "done", "finished_at": datetime.utcnow()}},
+            upsert=True
+        )
+        print(f"✅ sales_daily rebuilt: {sales_daily_collection.estimated_document_count()} rows")
+    else:
+        print("Usage: python -m utils.sales_rollup backfill")
@@ -0,0 +1,119 @@
+# utils/sales_velocity.py
+# Shared sales-velocity service. The analytics routes, purchase suggestions
+# and the AI analyzer all need "what sold per product over the last N days";
+# this computes it once per window from the sales_daily rollup and caches it
+# with a TTL. Local sales bump a version that invalidates the cache at once;
+# sales taken by other workers show up when the TTL expires.
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from database import db
+from utils.sales_rollup import day_start
+
+sales_daily_collection = db["sales_daily"]
+
+TTL_SECONDS = 60
+# longest window callers may ask for; the history matrix is products x days
+MAX_WINDOW_DAYS = 365
+MAX_CACHE_ENTRIES = 32
+
+_cache = OrderedDict()  # (kind, days) -> (expires_at, version, value)
+_version = 0
+_lock = threading.Lock()
+_compute_lock = threading.RLock()
+
+
+def bump_version():
+    """Called after every local sale write."""
+    global _version
+    with _lock:
+        _version += 1
+
+
+def _cached(key, compute):
+    with _lock:
+        hit = _cache.get(key)
+        if hit and hit[0] > time.monotonic() and hit[1] == _version:
+            return hit[2]
+
+    # one computation at a time; a caller that waited reuses the result
+    with _compute_lock:
+        with _lock:
+            hit = _cache.get(key)
+            if hit and hit[0] > time.monotonic() and hit[1] == _version:
+                return hit[2]
+            version = _version
+
+        value = compute()
+
+        with _lock:
+            now = time.monotonic()
+            for stale in [k for k, hit in _cache.items() if hit[0] <= now or hit[1] != _version]:
+                del _cache[stale]
+            _cache[key] = (now + TTL_SECONDS, version, value)
+            _cache.move_to_end(key)
+            while len(_cache) > MAX_CACHE_ENTRIES:
+                _cache.popitem(last=False)
+        return value
+
+
+def clamp_window(days: int) -> int:
+    return max(1, min(int(days), MAX_WINDOW_DAYS))
+
+
+def _load_history(days: int) -> Tuple[List[str], datetime, np.ndarray]:
+    today = day_start(datetime.utcnow())
+    start = today - timedelta(days=days)
+
+    rows = list(sales_daily_collection.aggregate([
+        {"$match": {"day": {"$gte": start}}},
+        {"$project": {"_id": 0, "product_id": 1, "day": 1, "qty": 1}}
+    ]))
+
+    product_ids = sorted({row["product_id"] for row in rows})
+    index = {pid: i for i, pid in enumerate(product_ids)}
+
+    matrix = np.zeros((len(product_ids), days + 1))
+    if rows:
+        np.add.at(
+            matrix,
+            (
+                np.fromiter((index[r["product_id"]] for r in rows), dtype=np.int64, count=len(rows)),
+                np.fromiter(((r["day"] - start).days for r in rows), dtype=np.int64, count=len(rows))
+            ),
+            np.fromiter((r["qty"] for r in rows), dtype=float, count=len(rows))
+        )
+
+    return product_ids, start, matrix
+
+
+def daily_history(days: int) -> Tuple[List[str], datetime, np.ndarray]:
+    """
+    (product_ids, first_day, matrix) where matrix[i, t] is the qty of
+    product_ids[i] sold on first_day + t. There are `days` complete days
+    followed by today's partial column. Treat the matrix as read-only.
+    """
+    days = clamp_window(days)
+    return _cached(("history", days), lambda: _load_history(days))
+
+
+def sold_qty(days: int) -> Dict[str, int]:
+    """product_id -> qty sold from the day `days` days ago up to now."""
+    days = clamp_window(days)
+
+    def compute():
+        product_ids, _, matrix = daily_history(days)
+        totals = matrix.sum(axis=1)
+        return {pid: int(totals[i]) for i, pid in enumerate(product_ids)}
+
+    return _cached(("sold_qty", days), compute)
+
+
+def avg_daily(days: int) -> Dict[str, float]:
+    days = clamp_window(days)
+    return {pid: qty / days for pid, qty in sold_qty(days).items()}
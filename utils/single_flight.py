@@ -0,0 +1,90 @@
+# utils/single_flight.py
+# Request coalescing for expensive read endpoints. Concurrent calls with the
+# same route + parameters share one in-flight computation, and its result is
+# reused for a short grace period. Waiting callers await on the event loop,
+# so they do not hold threadpool workers that checkout needs.
+import asyncio
+import functools
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+GRACE_SECONDS = 5.0
+MAX_REMEMBERED = 256
+
+_inflight = {}      # (event loop, key) -> asyncio.Future
+_recent = {}        # key -> (expires_at, result)
+
+
+def _normalize(kwargs, ignore):
+    return tuple(sorted(
+        (name, repr(value))
+        for name, value in kwargs.items()
+        if name not in ignore
+    ))
+
+
+def _remember(key, result, grace_seconds):
+    now = time.monotonic()
+    if len(_recent) >= MAX_REMEMBERED:
+        for old_key in [k for k, (expires_at, _) in _recent.items() if expires_at <= now]:
+            del _recent[old_key]
+        if len(_recent) >= MAX_REMEMBERED:
+            _recent.clear()
+    _recent[key] = (now + grace_seconds, result)
+
+
+def coalesce(grace_seconds=GRACE_SECONDS, ignore=("user",)):
+    """
+    Decorate a sync route handler. Parameters named in `ignore` (the auth
+    dependency by default) are not part of the key; every other parameter
+    is. The result object is shared between callers, so handlers must
+    return fresh data rather than objects they mutate later.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            key = (name, _normalize(kwargs, ignore))
+
+            cached = _recent.get(key)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+
+            loop = asyncio.get_running_loop()
+            flight = (loop, key)
+
+            future = _inflight.get(flight)
+            if future is not None:
+                try:
+                    return await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    if not future.cancelled():
+                        raise
+                    # the leading request was dropped; compute for ourselves
+                    return await wrapper(**kwargs)
+
+            future = loop.create_future()
+            # followers may not exist; don't warn about an unread exception
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            _inflight[flight] = future
+
+            try:
+                result = await run_in_threadpool(func, **kwargs)
+            except Exception as e:
+                future.set_exception(e)
+                raise
+            except BaseException:
+                future.cancel()
+                raise
+            finally:
+                _inflight.pop(flight, None)
+
+            future.set_result(result)
+            _remember(key, result, grace_seconds)
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,61 @@
+# utils/streaming.py
+# Streams a pymongo cursor straight to the client instead of building the
+# whole result list in memory first. Used by the large list endpoints when
+# called with ?stream=ndjson or ?stream=json.
+import json
+from datetime import date, datetime
+
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+STREAM_BATCH_SIZE = 500
+STREAM_FORMATS = ("ndjson", "json")
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _dumps(row):
+    return json.dumps(row, default=_default, ensure_ascii=False)
+
+
+def validate_stream_format(fmt):
+    if fmt not in STREAM_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"stream must be one of: {', '.join(STREAM_FORMATS)}"
+        )
+
+
+def stream_cursor(cursor, serialize, fmt="ndjson"):
+    """
+    Wrap a cursor in a StreamingResponse.
+
+    serialize(doc) turns one Mongo document into the row sent to the client.
+    ndjson emits one JSON object per line; json emits a single array written
+    incrementally, so peak memory stays at one cursor batch either way.
+    """
+    validate_stream_format(fmt)
+    cursor = cursor.batch_size(STREAM_BATCH_SIZE)
+
+    def ndjson_rows():
+        for doc in cursor:
+            yield _dumps(serialize(doc)) + "\n"
+
+    def json_array():
+        yield "["
+        first = True
+        for doc in cursor:
+            yield ("" if first else ",") + _dumps(serialize(doc))
+            first = False
+        yield "]"
+
+    if fmt == "ndjson":
+        return StreamingResponse(ndjson_rows(), media_type="application/x-ndjson")
+    return StreamingResponse(json_array(), media_type="application/json")